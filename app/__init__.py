@@ -1,12 +1,14 @@
+import atexit
+import logging
 import os
-import sys
-from typing import Any, Dict, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Any, Callable, Dict, FrozenSet, NamedTuple, Optional, Set
 
-from flask import Flask, abort, jsonify, render_template, request, send_from_directory
+from flask import Flask, Response, abort, jsonify, request
 from dotenv import load_dotenv
 
 from linebot import LineBotApi, WebhookHandler
-from linebot.exceptions import InvalidSignatureError
 from linebot.models import (
     ImageMessage,
     LocationMessage,
@@ -27,22 +29,35 @@ from . import event_report_topic
 from .event_report_topic.api import api_bp as report_event_api_bp
 from .demos import message_types, quick_replies
 from . import state
-from .paths import STATIC_DIR, DATA_DIR, EVENT_PICTURES_DIR
+from .paths import STATIC_DIR, DATA_DIR, EVENT_PICTURES_DIR, TEMPLATES_DIR
 from .auth import auth_bp, login_required
 from .audit_log import init_app as audit_init_app, record_action as audit_record_action
 from .static_data import static_data_bp
+from .logging_config import configure_logging
+from .json_provider import ORJSONProvider
+from .line_api import (
+    RawBodySignatureValidator,
+    VerifiedSignature,
+    batched_replies,
+    create_line_bot_api,
+    prebuild_messages,
+)
+from .webhook_dedup import dedupe_event
 
 
 load_dotenv()
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 audit_init_app(app)
 
 
-def _as_env_set(value: str | None) -> Set[str]:
+def _as_env_set(value: str | None) -> FrozenSet[str]:
     if not value:
-        return set()
-    return {item.strip().lower() for item in value.split(",") if item.strip()}
+        return frozenset()
+    return frozenset(item.strip().lower() for item in value.split(",") if item.strip())
 
 
 app.secret_key = os.getenv("FLASK_SECRET_KEY") or os.getenv("SECRET_KEY") or "dev-secret-key"
@@ -63,19 +78,65 @@ CHANNEL_SECRET = os.getenv("LINE_CHANNEL_SECRET")
 CHANNEL_ACCESS_TOKEN = os.getenv("LINE_CHANNEL_ACCESS_TOKEN")
 
 if not CHANNEL_SECRET or not CHANNEL_ACCESS_TOKEN:
-    print(
-        "ERROR: Missing LINE credentials. Set LINE_CHANNEL_SECRET and LINE_CHANNEL_ACCESS_TOKEN.",
-        file=sys.stderr,
-    )
+    if os.getenv("APP_ENV") == "production":
+        raise RuntimeError("Missing LINE credentials. Set LINE_CHANNEL_SECRET and LINE_CHANNEL_ACCESS_TOKEN.")
+    logger.error("Missing LINE credentials. Set LINE_CHANNEL_SECRET and LINE_CHANNEL_ACCESS_TOKEN.")
 
-line_bot_api = LineBotApi(CHANNEL_ACCESS_TOKEN) if CHANNEL_ACCESS_TOKEN else None
+line_bot_api = create_line_bot_api(CHANNEL_ACCESS_TOKEN) if CHANNEL_ACCESS_TOKEN else None
 handler = WebhookHandler(CHANNEL_SECRET) if CHANNEL_SECRET else None
+if handler is not None:
+    # Verify the raw body bytes; the parser's json.loads accepts bytes as well.
+    handler.parser.signature_validator = RawBodySignatureValidator(CHANNEL_SECRET)
+
+# Webhook events are handled off the request thread so LINE gets its 200 right away.
+# Each lane is a single thread and a sender always maps to the same lane, so one chat's
+# events run in the order they arrived while different chats still run in parallel.
+webhook_lanes = tuple(
+    ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"line-webhook-{index}")
+    for index in range(int(os.getenv("LINE_WEBHOOK_WORKERS", "32")))
+)
+
+
+def shutdown_webhook_lanes() -> None:
+    """Run every queued webhook event to completion before the process exits."""
+    for lane in webhook_lanes:
+        lane.shutdown(wait=True)
+
+
+atexit.register(shutdown_webhook_lanes)
 
 
-def _send_html(filename: str):
-    response = send_from_directory(str(STATIC_DIR), filename)
-    response.headers.setdefault("Content-Type", "text/html; charset=utf-8")
-    return response
+STATIC_PAGE_MAX_AGE = int(os.getenv("STATIC_PAGE_MAX_AGE", "300"))
+_PUBLIC_CACHE_CONTROL = f"public, max-age={STATIC_PAGE_MAX_AGE}, must-revalidate"
+
+# filename -> (mtime_ns, body). static/ may be bind-mounted, so a changed mtime reloads the page.
+_STATIC_PAGE_CACHE: Dict[str, tuple[int, bytes]] = {}
+
+
+def _read_static_page(filename: str) -> tuple[os.stat_result, bytes]:
+    path = STATIC_DIR / filename
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        abort(404)
+    cached = _STATIC_PAGE_CACHE.get(filename)
+    if cached is None or cached[0] != stat.st_mtime_ns:
+        cached = (stat.st_mtime_ns, path.read_bytes())
+        _STATIC_PAGE_CACHE[filename] = cached
+    return stat, cached[1]
+
+
+def _send_html(filename: str, *, public: bool = True):
+    stat, body = _read_static_page(filename)
+    response = Response(body, mimetype="text/html")
+    response.last_modified = stat.st_mtime
+    response.set_etag(f"{stat.st_mtime_ns:x}-{len(body):x}")
+    if public:
+        response.headers["Cache-Control"] = _PUBLIC_CACHE_CONTROL
+    else:
+        # Admin pages sit behind a login check; let browsers revalidate every time.
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
 
 STATIC_PAGE_ROUTES = [
     ("/rainfall.html", "rainfall.html", False),
@@ -88,9 +149,9 @@ STATIC_PAGE_ROUTES = [
 ]
 
 
-def _make_static_page_handler(filename: str):
+def _make_static_page_handler(filename: str, public: bool):
     def handler():
-        return _send_html(filename)
+        return _send_html(filename, public=public)
 
     handler.__name__ = f"static_page_{filename.replace('.', '_')}"
     return handler
@@ -98,7 +159,7 @@ def _make_static_page_handler(filename: str):
 
 def _register_static_page_routes():
     for route, filename, requires_auth in STATIC_PAGE_ROUTES:
-        view_func = _make_static_page_handler(filename)
+        view_func = _make_static_page_handler(filename, not requires_auth)
         if requires_auth:
             view_func = login_required(view_func)
         endpoint = f"static_page_{filename.replace('.', '_')}"
@@ -108,84 +169,102 @@ def _register_static_page_routes():
 _register_static_page_routes()
 
 
+_HEALTH_BODY = b'{"status":"ok"}\n'
+
+
 @app.get("/")
 def health():
-    return {"status": "ok"}
+    # Load balancers poll this constantly; the body never changes, so skip the JSON provider.
+    return Response(_HEALTH_BODY, mimetype="application/json")
 
 
 @app.post("/callback")
 def callback():
     signature = request.headers.get("X-Line-Signature", "")
-    body = request.get_data(as_text=True)
+    body = request.get_data(cache=False)
 
     if handler is None:
         abort(500, description="LINE handler not configured")
 
-    try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
+    if not handler.parser.signature_validator.validate(body, signature):
         abort(400, description="Invalid signature")
 
+    # Parsing and routing are cheap; the registered handlers only queue each event on its lane.
+    # VerifiedSignature keeps the parser from hashing the body a second time.
+    handler.handle(body, VerifiedSignature(signature))
     return "OK"
 
 
+def _run_webhook_event(func, event) -> None:
+    with app.app_context():
+        try:
+            func(event)
+        except Exception:  # pragma: no cover - background dispatch
+            logger.exception("Failed to handle LINE webhook event")
+
+
+def _in_source_lane(func):
+    @wraps(func)
+    def wrapper(event):
+        lane = webhook_lanes[hash(state.source_key(event)) % len(webhook_lanes)]
+        lane.submit(_run_webhook_event, func, event)
+
+    return wrapper
+
+
+# The login prompt has no dynamic fields, so it is read once and served as bytes.
+_UNAUTHORIZED_HTML = (TEMPLATES_DIR / "errors" / "401.html").read_bytes()
+_UNAUTHORIZED_HEADERS = {"Content-Type": "text/html; charset=utf-8"}
+_API_PREFIX = "/api/"
+_LOGIN_PROMPT_PATHS = frozenset(route for route, _, requires_auth in STATIC_PAGE_ROUTES if requires_auth)
+
+
 @app.errorhandler(401)
 def handle_unauthorized(error):
     description = (getattr(error, "description", None) or "Unauthorized").strip()
-    if request.path.startswith("/api/"):
+    path = request.path
+    if path.startswith(_API_PREFIX):
         return jsonify({"error": description, "status": 401}), 401
-    if request.path.endswith("events_admin.html"):
-        return render_template("errors/401.html", description=description), 401
+    if path in _LOGIN_PROMPT_PATHS:
+        return Response(_UNAUTHORIZED_HTML, status=401, headers=_UNAUTHORIZED_HEADERS)
     return description, 401
 
 
-def _source_key(event: MessageEvent) -> str:
-    source = event.source
-    if getattr(source, "user_id", None):
-        return f"user:{source.user_id}"
-    if getattr(source, "group_id", None):
-        return f"group:{source.group_id}"
-    if getattr(source, "room_id", None):
-        return f"room:{source.room_id}"
-    return "unknown"
-
-
 def _line_actor_info(event) -> tuple[str, Optional[str]]:
-    source = event.source
-    if getattr(source, "user_id", None):
-        return "user", source.user_id
-    if getattr(source, "group_id", None):
-        return "group", source.group_id
-    if getattr(source, "room_id", None):
-        return "room", source.room_id
-    return "unknown", None
+    actor_type, actor_id = state.source_actor(event)
+    return actor_type or "unknown", actor_id
 
 
 def _line_event_metadata(event) -> Dict[str, Any]:
-    metadata: Dict[str, Any] = {"event_type": getattr(event, "type", None)}
-    message = getattr(event, "message", None)
+    event_fields = vars(event)
+    metadata: Dict[str, Any] = {
+        "event_type": event_fields.get("type"),
+        "reply_token": event_fields.get("reply_token"),
+    }
+    message = event_fields.get("message")
     if message is not None:
-        metadata["message_type"] = getattr(message, "type", None)
-        message_id = getattr(message, "id", None)
+        message_fields = vars(message)
+        metadata["message_type"] = message_fields.get("type")
+        message_id = message_fields.get("id")
         if message_id:
             metadata["message_id"] = message_id
-        text_value = getattr(message, "text", None)
-        if text_value:
-            metadata["text"] = text_value
-        if hasattr(message, "latitude") and hasattr(message, "longitude"):
-            metadata["latitude"] = getattr(message, "latitude", None)
-            metadata["longitude"] = getattr(message, "longitude", None)
-        title_value = getattr(message, "title", None)
-        if title_value:
-            metadata["title"] = title_value
-        address_value = getattr(message, "address", None)
-        if address_value:
-            metadata["address"] = address_value
-    postback = getattr(event, "postback", None)
+        text = message_fields.get("text")
+        if text:
+            metadata["text"] = text
+        if "latitude" in message_fields and "longitude" in message_fields:
+            metadata["latitude"] = message_fields["latitude"]
+            metadata["longitude"] = message_fields["longitude"]
+        title = message_fields.get("title")
+        if title:
+            metadata["title"] = title
+        address = message_fields.get("address")
+        if address:
+            metadata["address"] = address
+    postback = event_fields.get("postback")
     if postback is not None:
-        metadata["postback_data"] = getattr(postback, "data", None)
-        metadata["postback_params"] = getattr(postback, "params", None)
-    metadata["reply_token"] = getattr(event, "reply_token", None)
+        postback_fields = vars(postback)
+        metadata["postback_data"] = postback_fields.get("data")
+        metadata["postback_params"] = postback_fields.get("params")
     return metadata
 
 
@@ -215,36 +294,122 @@ def _record_line_event(
     )
 
 
+# The SDK serializes messages without mutating them, so the fallback reply can be shared.
+HELPER_QUICK_REPLY = QuickReply(
+    items=[
+        QuickReplyButton(action=MessageAction(label="回報事件", text="回報事件")),
+        QuickReplyButton(action=MessageAction(label="查雨量", text="查雨量")),
+        # QuickReplyButton(action=MessageAction(label="里程轉坐標", text="里程轉坐標")),
+        # QuickReplyButton(action=MessageAction(label="坐標轉里程", text="坐標轉里程")),
+        QuickReplyButton(action=MessageAction(label="CCTV", text="CCTV")),
+        QuickReplyButton(action=MessageAction(label="取消", text="取消")),
+    ]
+)
+HELLO_REPLY = prebuild_messages(
+    TextSendMessage(text='你好，我是「小鐵」，需要協助嗎？', quick_reply=HELPER_QUICK_REPLY)
+)
+
+
+class TextHandler(NamedTuple):
+    name: str
+    handle: Callable[[MessageEvent, LineBotApi], bool]
+    topic: str
+    triggers: FrozenSet[str]
+    cancels: FrozenSet[str] = frozenset()
+
+
+# Fallback priority order.
 TEXT_MESSAGE_HANDLERS = [
-    ("rainfall_topic", rainfall_topic.handle_message_event),
-    ("cctv_topic", cctv_topic.handle_message_event),
-    ("location_topic", location_topic.handle_message_event),
-    ("event_report_topic", event_report_topic.handle_message_event),
-    ("quick_replies", quick_replies.handle_message_event),
-    ("message_types", message_types.handle_message_event),
+    TextHandler(
+        "rainfall_topic",
+        rainfall_topic.handle_message_event,
+        rainfall_topic.CHECK_RAINFALL_TOPIC,
+        rainfall_topic.TRIGGER_KEYWORDS,
+        rainfall_topic.CANCEL_KEYWORDS,
+    ),
+    TextHandler(
+        "cctv_topic",
+        cctv_topic.handle_message_event,
+        cctv_topic.CHECK_CCTV_TOPIC,
+        cctv_topic.TRIGGER_KEYWORDS,
+        cctv_topic.CANCEL_KEYWORDS,
+    ),
+    TextHandler(
+        "location_topic",
+        location_topic.handle_message_event,
+        location_topic.FIND_LOCATION_TOPIC,
+        location_topic.TRIGGER_KEYWORDS,
+        location_topic.CANCEL_KEYWORDS,
+    ),
+    TextHandler(
+        "event_report_topic",
+        event_report_topic.handle_message_event,
+        event_report_topic.REPORT_EVENT_TOPIC,
+        event_report_topic.TRIGGER_KEYWORDS,
+        event_report_topic.CANCEL_KEYWORDS,
+    ),
+    TextHandler(
+        "quick_replies",
+        quick_replies.handle_message_event,
+        quick_replies.DEMO_QUICK_REPLY_TOPIC,
+        quick_replies.TRIGGER_KEYWORDS,
+    ),
+    TextHandler(
+        "message_types",
+        message_types.handle_message_event,
+        message_types.DEMO_MESSAGE_TYPES_TOPIC,
+        message_types.TRIGGER_KEYWORDS,
+    ),
 ]
 
 
-def _dispatch_text_handlers(event: MessageEvent) -> Optional[str]:
-    for handler_name, handler in TEXT_MESSAGE_HANDLERS:
-        if handler(event, line_bot_api):
-            return handler_name
-    return None
+def _keyword_token(text: str) -> str:
+    # Matches the loosest normalization any topic applies (event_report_topic's).
+    return "".join(text.split()).lower()
 
 
-@handler.add(MessageEvent, message=TextMessage)
-def handle_text_message(event: MessageEvent):
-    print(f"Received message: {event.message.text}")
-    if line_bot_api is None:
-        _record_line_event(
-            "line.text_message",
-            event,
-            status="failure",
-            message="LINE handler not configured",
-        )
-        return
+def _build_text_routes() -> tuple[Dict[str, int], Dict[str, int], FrozenSet[str]]:
+    routes: Dict[str, int] = {}
+    topics: Dict[str, int] = {}
+    reserved: Set[str] = set()
+    for index, text_handler in enumerate(TEXT_MESSAGE_HANDLERS):
+        topics[text_handler.topic] = index
+        for keyword in text_handler.triggers:
+            if keyword in routes:
+                raise ValueError(f"Trigger keyword {keyword!r} is claimed by more than one text handler")
+            routes[keyword] = index
+        reserved.update(_keyword_token(keyword) for keyword in text_handler.triggers | text_handler.cancels)
+    return routes, topics, frozenset(reserved)
+
 
-    handled_by = _dispatch_text_handlers(event)
+TEXT_ROUTES, _TOPIC_HANDLER_INDEX, _RESERVED_TOKENS = _build_text_routes()
+
+
+def _dispatch_text_handlers(event: MessageEvent, line_bot_api: LineBotApi) -> Optional[str]:
+    text = (event.message.text or "").strip()
+    topic_index = _TOPIC_HANDLER_INDEX.get(state.get_topic(state.source_key(event)))
+
+    route_index = TEXT_ROUTES.get(text)
+    if route_index is not None:
+        # An earlier handler only claims trigger text while its own topic is active.
+        if topic_index is None or topic_index >= route_index:
+            text_handler = TEXT_MESSAGE_HANDLERS[route_index]
+            if text_handler.handle(event, line_bot_api):
+                return text_handler.name
+    elif topic_index is not None and _keyword_token(text) not in _RESERVED_TOKENS:
+        # Free text outside every trigger/cancel set can only be claimed by the active topic.
+        text_handler = TEXT_MESSAGE_HANDLERS[topic_index]
+        return text_handler.name if text_handler.handle(event, line_bot_api) else None
+
+    for text_handler in TEXT_MESSAGE_HANDLERS:
+        if text_handler.handle(event, line_bot_api):
+            return text_handler.name
+    return None
+
+
+def handle_text_message(event: MessageEvent, line_bot_api: LineBotApi):
+    logger.debug("Received text message %s", event.message.id)
+    handled_by = _dispatch_text_handlers(event, line_bot_api)
     if handled_by:
         _record_line_event(
             "line.text_message",
@@ -253,24 +418,10 @@ def handle_text_message(event: MessageEvent):
         )
         return
 
-    source_key = _source_key(event)
-    current_topic = state.get_topic(source_key)
-    state.set_topic(source_key, None)
+    source_key = state.source_key(event)
+    current_topic = state.pop_topic(source_key)
     if current_topic is None:
-        helper_quick_reply = QuickReply(
-            items=[
-                QuickReplyButton(action=MessageAction(label="回報事件", text="回報事件")),
-                QuickReplyButton(action=MessageAction(label="查雨量", text="查雨量")),
-                # QuickReplyButton(action=MessageAction(label="里程轉坐標", text="里程轉坐標")),
-                # QuickReplyButton(action=MessageAction(label="坐標轉里程", text="坐標轉里程")),
-                QuickReplyButton(action=MessageAction(label="CCTV", text="CCTV")),
-                QuickReplyButton(action=MessageAction(label="取消", text="取消")),
-            ]
-        )
-        line_bot_api.reply_message(
-            event.reply_token,
-            TextSendMessage(text='你好，我是「小鐵」，需要協助嗎？', quick_reply=helper_quick_reply),
-        )
+        line_bot_api.reply_message(event.reply_token, HELLO_REPLY)
     else:
         line_bot_api.reply_message(
             event.reply_token,
@@ -283,17 +434,7 @@ def handle_text_message(event: MessageEvent):
     )
 
 
-@handler.add(PostbackEvent)
-def handle_postback_event(event: PostbackEvent):
-    if line_bot_api is None:
-        _record_line_event(
-            "line.postback",
-            event,
-            status="failure",
-            message="LINE handler not configured",
-        )
-        return
-
+def handle_postback_event(event: PostbackEvent, line_bot_api: LineBotApi):
     if quick_replies.handle_postback_event(event, line_bot_api):
         _record_line_event(
             "line.postback",
@@ -309,52 +450,27 @@ def handle_postback_event(event: PostbackEvent):
     )
 
 
-@handler.add(MessageEvent, message=LocationMessage)
-def handle_location_message(event: MessageEvent):
-    if line_bot_api is None:
-        _record_line_event(
-            "line.location_message",
-            event,
-            status="failure",
-            message="LINE handler not configured",
-        )
-        return
+LOCATION_MESSAGE_HANDLERS = (
+    ("event_report_topic", event_report_topic.handle_location_message),
+    ("rainfall_topic", rainfall_topic.handle_location_message),
+    ("cctv_topic", cctv_topic.handle_location_message),
+    ("location_topic", location_topic.handle_location_message),
+)
 
-    handled_by: Optional[str] = None
-    if event_report_topic.handle_location_message(event, line_bot_api):
-        handled_by = "event_report_topic"
-    elif rainfall_topic.handle_location_message(event, line_bot_api):
-        handled_by = "rainfall_topic"
-    elif cctv_topic.handle_location_message(event, line_bot_api):
-        handled_by = "cctv_topic"
-    elif location_topic.handle_location_message(event, line_bot_api):
-        handled_by = "location_topic"
 
-    if handled_by:
-        _record_line_event(
-            "line.location_message",
-            event,
-            metadata={"handled_by": handled_by},
-        )
-    else:
-        _record_line_event(
-            "line.location_message",
-            event,
-            metadata={"handled_by": "unhandled"},
-        )
+def handle_location_message(event: MessageEvent, line_bot_api: LineBotApi):
+    handled_by = next(
+        (name for name, location_handler in LOCATION_MESSAGE_HANDLERS if location_handler(event, line_bot_api)),
+        "unhandled",
+    )
+    _record_line_event(
+        "line.location_message",
+        event,
+        metadata={"handled_by": handled_by},
+    )
 
 
-@handler.add(MessageEvent, message=ImageMessage)
-def handle_image_message(event: MessageEvent):
-    if line_bot_api is None:
-        _record_line_event(
-            "line.image_message",
-            event,
-            status="failure",
-            message="LINE handler not configured",
-        )
-        return
-
+def handle_image_message(event: MessageEvent, line_bot_api: LineBotApi):
     if event_report_topic.handle_image_message(event, line_bot_api):
         _record_line_event(
             "line.image_message",
@@ -370,6 +486,53 @@ def handle_image_message(event: MessageEvent):
     )
 
 
+def _record_unconfigured_event(event) -> None:
+    message = getattr(event, "message", None)
+    action_type = f"line.{message.type}_message" if message is not None else f"line.{event.type}"
+    _record_line_event(
+        action_type,
+        event,
+        status="failure",
+        message="LINE handler not configured",
+    )
+
+
+def _with_batched_replies(func):
+    # Handlers reply through a buffer so each event costs at most one reply request.
+    @wraps(func)
+    def wrapper(event):
+        with batched_replies(line_bot_api) as replies:
+            func(event, replies)
+
+    return wrapper
+
+
+def _as_webhook_handler(func):
+    # Queue on the sender's lane first, so the dedup check and the replies run off the request thread.
+    return _in_source_lane(dedupe_event(_with_batched_replies(func)))
+
+
+def _register_webhook_handlers() -> None:
+    # Pick the handler set once at import instead of checking line_bot_api per event.
+    if handler is None:
+        return
+    if line_bot_api is None:
+        # Only the event kinds we would have answered are audited as failures; follow/join etc. stay silent.
+        handler.add(MessageEvent, message=TextMessage)(_record_unconfigured_event)
+        handler.add(PostbackEvent)(_record_unconfigured_event)
+        handler.add(MessageEvent, message=LocationMessage)(_record_unconfigured_event)
+        handler.add(MessageEvent, message=ImageMessage)(_record_unconfigured_event)
+        return
+    # Redelivered events (e.g. after a timeout) are skipped instead of replying twice.
+    handler.add(MessageEvent, message=TextMessage)(_as_webhook_handler(handle_text_message))
+    handler.add(PostbackEvent)(_as_webhook_handler(handle_postback_event))
+    handler.add(MessageEvent, message=LocationMessage)(_as_webhook_handler(handle_location_message))
+    handler.add(MessageEvent, message=ImageMessage)(_as_webhook_handler(handle_image_message))
+
+
+_register_webhook_handlers()
+
+
 def main():
     port = int(os.getenv("PORT", "8000"))
     host = os.getenv("HOST", "0.0.0.0")
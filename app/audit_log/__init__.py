@@ -1,27 +1,22 @@
 """Audit logging helpers and Flask integration."""
 from __future__ import annotations
 
-import json
 import sys
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Optional
 
-from flask import Flask, Response, current_app, g, request, session
+from flask import Flask, Response, current_app, g, has_app_context, request, session
 from werkzeug.exceptions import HTTPException
 
-from . import repository
+from . import repository, writer
 
 _DEFAULT_HTTP_PREFIXES: tuple[str, ...] = ("/api/", "/auth/", "/callback")
 
 
-def _is_enabled(app: Optional[Flask] = None) -> bool:
-    if app is None:
-        try:
-            app = current_app._get_current_object()
-        except RuntimeError:
-            app = None
-    if app is None:
-        return True
-    return app.config.get("AUDIT_LOG_ENABLED", True)
+def _setting(name: str, default: Any) -> Any:
+    # Read per call so config changes and multiple apps are honoured; outside an app, use the default.
+    if not has_app_context():
+        return default
+    return current_app.config.get(name, default)
 
 
 def _resolve_ip_address() -> Optional[str]:
@@ -71,19 +66,21 @@ def record_action(
     status: str = "success",
     message: Optional[str] = None,
     metadata: Optional[Any] = None,
+    method: Optional[str] = None,
+    status_code: Optional[int] = None,
+    user_agent: Optional[str] = None,
+    endpoint: Optional[str] = None,
 ) -> Optional[int]:
-    """Persist an audit log entry. Swallows DB errors to avoid user impact."""
+    """Persist an audit log entry. Swallows DB errors to avoid user impact.
+
+    Entries are handed to the background writer by default and ``None`` is returned;
+    set ``AUDIT_LOG_ASYNC`` to False to insert synchronously and get the row id back.
+    """
     if not action_type:
         raise ValueError("action_type is required")
-    if not _is_enabled():
+    if not _setting("AUDIT_LOG_ENABLED", True):
         return None
     actor_type, actor_id, actor_name = _normalize_actor(actor, actor_type, actor_id, actor_name)
-    details_text: Optional[str] = None
-    if metadata is not None:
-        try:
-            details_text = json.dumps(metadata, ensure_ascii=False)
-        except (TypeError, ValueError):
-            details_text = json.dumps({"value": str(metadata)}, ensure_ascii=False)
     payload = {
         "action_type": action_type,
         "channel": channel,
@@ -95,8 +92,17 @@ def record_action(
         "resource_id": resource_id,
         "status": (status or "success").lower(),
         "message": message,
-        "details": details_text,
+        "method": method,
+        "status_code": status_code,
+        "user_agent": user_agent,
+        "endpoint": endpoint,
     }
+    if _setting("AUDIT_LOG_ASYNC", True):
+        # The writer thread encodes metadata, keeping json.dumps off the webhook/request thread.
+        payload["metadata"] = metadata
+        writer.enqueue(payload)
+        return None
+    payload["details"] = repository.encode_details(metadata)
     try:
         return repository.insert_log(payload)
     except Exception as exc:  # pragma: no cover - logging fallback
@@ -104,19 +110,14 @@ def record_action(
         return None
 
 
-def _should_log_request(app: Flask, path: str) -> bool:
-    prefixes: Iterable[str] = app.config.get("AUDIT_LOG_HTTP_PREFIXES", _DEFAULT_HTTP_PREFIXES)
-    return any(path.startswith(prefix) for prefix in prefixes)
-
-
 def _finalize_http_audit(app: Flask, response: Optional[Response] = None, error: Optional[BaseException] = None) -> None:
     info = getattr(g, "_audit_request_info", None)
     if not info or getattr(g, "_audit_http_logged", False):
         return
-    if not _is_enabled(app):
+    if not app.config.get("AUDIT_LOG_ENABLED", True):
         return
-    info["endpoint"] = request.endpoint or info.get("endpoint")
-    info["full_path"] = request.full_path or info.get("full_path")
+    # endpoint and full_path were captured in before_request (URL matching happens first).
+    # The session actor is resolved here on purpose: login/logout change it mid-request.
     status_code: int = 500
     message: Optional[str] = None
     if error is not None:
@@ -131,14 +132,7 @@ def _finalize_http_audit(app: Flask, response: Optional[Response] = None, error:
         message = response.status
 
     status = "success" if status_code < 400 and error is None else "failure"
-    metadata = {
-        "method": info.get("method"),
-        "path": info.get("path"),
-        "query_string": info.get("query_string"),
-        "status_code": status_code,
-        "user_agent": info.get("user_agent"),
-        "endpoint": info.get("endpoint"),
-    }
+    # Request fields go to their own columns; path and query string are in resource_id already.
     resource_identifier = info.get("full_path") or info.get("path")
     record_action(
         "http.request",
@@ -149,7 +143,10 @@ def _finalize_http_audit(app: Flask, response: Optional[Response] = None, error:
         resource_id=resource_identifier,
         status=status,
         message=message,
-        metadata=metadata,
+        method=info.get("method"),
+        status_code=status_code,
+        user_agent=info.get("user_agent"),
+        endpoint=info.get("endpoint"),
     )
     g._audit_http_logged = True
 
@@ -159,6 +156,7 @@ def init_app(app: Flask) -> None:
     app.config.setdefault("AUDIT_LOG_ENABLED", True)
     app.config.setdefault("AUDIT_LOG_HTTP_PREFIXES", _DEFAULT_HTTP_PREFIXES)
     app.config.setdefault("AUDIT_LOG_HTTP_CHANNEL", "http")
+    app.config.setdefault("AUDIT_LOG_ASYNC", True)
 
     if app.extensions.get("audit_log_initialized"):
         return
@@ -166,20 +164,23 @@ def init_app(app: Flask) -> None:
 
     @app.before_request
     def _capture_request_for_audit() -> None:  # pragma: no cover - exercised via integration tests
-        if not _is_enabled(app):
+        config = app.config
+        if not config.get("AUDIT_LOG_ENABLED", True):
             return
         path = request.path or ""
-        if not _should_log_request(app, path):
+        # str.startswith() takes the whole prefix tuple in one C-level call.
+        if not path.startswith(tuple(config.get("AUDIT_LOG_HTTP_PREFIXES", _DEFAULT_HTTP_PREFIXES))):
             return
+        query_string = request.query_string
         g._audit_request_info = {
             "method": request.method,
             "path": path,
-            "full_path": request.full_path,
-            "query_string": request.query_string.decode("utf-8", errors="ignore"),
+            # request.full_path always appends "?", even without a query string.
+            "full_path": f"{path}?{query_string.decode('utf-8', errors='ignore')}" if query_string else path,
             "ip_address": _resolve_ip_address(),
             "user_agent": request.headers.get("User-Agent"),
             "endpoint": request.endpoint,
-            "channel": app.config.get("AUDIT_LOG_HTTP_CHANNEL", "http"),
+            "channel": config.get("AUDIT_LOG_HTTP_CHANNEL", "http"),
         }
         g._audit_http_logged = False
 
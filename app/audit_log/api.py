@@ -3,8 +3,8 @@ from __future__ import annotations
 
 import csv
 import io
-import json
-from typing import Dict
+import operator
+from typing import Dict, Iterator, Optional, Tuple
 
 from flask import Blueprint, Response, abort, jsonify, request
 
@@ -27,7 +27,15 @@ _CSV_FIELDS = (
     "resource_id",
     "message",
     "details",
+    "method",
+    "status_code",
+    "user_agent",
+    "endpoint",
 )
+_CSV_CHUNK_SIZE = 16 * 1024
+# Rows from the repository always carry every column, so a C-level itemgetter can build them.
+# details is exported as the stored JSON text rather than re-encoding the parsed value.
+_CSV_ROW = operator.itemgetter(*("details_raw" if field == "details" else field for field in _CSV_FIELDS))
 
 
 def _parse_int(value: str, default: int, minimum: int, maximum: int) -> int:
@@ -38,7 +46,14 @@ def _parse_int(value: str, default: int, minimum: int, maximum: int) -> int:
     return max(minimum, min(parsed, maximum))
 
 
-def _extract_filters() -> Dict[str, str]:
+def _parse_status_code(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _extract_filters() -> Dict[str, object]:
     return {
         "action_type": (request.args.get("action_type") or "").strip() or None,
         "actor_id": (request.args.get("actor_id") or "").strip() or None,
@@ -46,64 +61,73 @@ def _extract_filters() -> Dict[str, str]:
         "channel": (request.args.get("channel") or "").strip() or None,
         "resource_type": (request.args.get("resource_type") or "").strip() or None,
         "resource_id": (request.args.get("resource_id") or "").strip() or None,
+        "method": (request.args.get("method") or "").strip() or None,
+        "status_code": _parse_status_code(request.args.get("status_code")),
         "start_time": (request.args.get("start_time") or "").strip() or None,
         "end_time": (request.args.get("end_time") or "").strip() or None,
         "keyword": (request.args.get("keyword") or "").strip() or None,
     }
 
 
+def _parse_cursor(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    if not value:
+        return None
+    created_at, _, row_id = value.rpartition(",")
+    try:
+        return created_at, int(row_id)
+    except ValueError:
+        abort(400, description="Invalid cursor")
+
+
 @api_bp.get("/")
 @login_required
 def list_logs():
     limit = _parse_int(request.args.get("limit") or 20, 20, 1, 200)
-    page = _parse_int(request.args.get("page") or 1, 1, 1, 1_000_000)
-    offset = (page - 1) * limit
     filters = _extract_filters()
-    items = repository.query_logs(limit=limit, offset=offset, **filters)
-    total = repository.count_logs(**filters)
-    pages = max(1, (total + limit - 1) // limit)
-    return jsonify(
-        {
+    before = _parse_cursor(request.args.get("before"))
+    if before is not None:
+        # Keyset pages cost the same at any depth; the total is only counted on request.
+        items = repository.query_logs(limit=limit, offset=0, before=before, **filters)
+        payload = {"count": len(items), "items": items, "limit": limit}
+        if request.args.get("with_total") == "1":
+            payload["total"] = repository.count_logs(**filters)
+    else:
+        page = _parse_int(request.args.get("page") or 1, 1, 1, 1_000_000)
+        offset = (page - 1) * limit
+        items = repository.query_logs(limit=limit, offset=offset, **filters)
+        total = repository.count_logs(**filters)
+        payload = {
             "count": len(items),
             "items": items,
             "limit": limit,
             "offset": offset,
             "page": page,
-            "pages": pages,
+            "pages": max(1, (total + limit - 1) // limit),
             "total": total,
         }
-    )
+    last = items[-1] if len(items) == limit else None
+    payload["next_cursor"] = f"{last['created_at']},{last['id']}" if last else None
+    return jsonify(payload)
 
 
-def _export_csv(items) -> Response:
+def _iter_csv(items) -> Iterator[str]:
+    # Rows are flushed out of a small reusable buffer so large exports are never held in memory.
     buffer = io.StringIO()
     writer = csv.writer(buffer)
     writer.writerow(_CSV_FIELDS)
     for item in items:
-        details = item.get("details")
-        if details is not None and not isinstance(details, str):
-            try:
-                details = json.dumps(details, ensure_ascii=False)
-            except (TypeError, ValueError):
-                details = str(details)
-        writer.writerow(
-            [
-                item.get("id"),
-                item.get("created_at"),
-                item.get("action_type"),
-                item.get("status"),
-                item.get("channel"),
-                item.get("actor_type"),
-                item.get("actor_id"),
-                item.get("actor_name"),
-                item.get("ip_address"),
-                item.get("resource_type"),
-                item.get("resource_id"),
-                item.get("message"),
-                details,
-            ]
-        )
-    response = Response(buffer.getvalue(), mimetype="text/csv; charset=utf-8")
+        writer.writerow(_CSV_ROW(item))
+        if buffer.tell() >= _CSV_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    tail = buffer.getvalue()
+    if tail:
+        yield tail
+
+
+def _export_csv(items) -> Response:
+    response = Response(_iter_csv(items), mimetype="text/csv; charset=utf-8")
     response.headers["Content-Disposition"] = "attachment; filename=audit_logs.csv"
     return response
 
@@ -113,10 +137,10 @@ def _export_csv(items) -> Response:
 def export_logs():
     format_type = (request.args.get("format") or "csv").lower()
     filters = _extract_filters()
-    items = repository.export_logs(**filters)
     if format_type == "json":
+        items = repository.export_logs(**filters)
         return jsonify({"items": items, "total": len(items)})
-    return _export_csv(items)
+    return _export_csv(repository.iter_logs(**filters))
 
 
 @api_bp.post("/clear")
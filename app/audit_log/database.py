@@ -5,12 +5,61 @@ import os
 import sqlite3
 import threading
 from pathlib import Path
-from typing import Optional
 
 from ..paths import AUDIT_LOG_DB_PATH
 
-_CONNECTION: Optional[sqlite3.Connection] = None
+# One connection per thread (WAL lets readers proceed while the writer thread commits).
+_LOCAL = threading.local()
 _LOCK = threading.Lock()
+_SCHEMA_READY = False
+_FTS_ENABLED = False
+
+_HTTP_COLUMNS = (
+    ("method", "TEXT"),
+    ("status_code", "INTEGER"),
+    ("user_agent", "TEXT"),
+    ("endpoint", "TEXT"),
+)
+
+# Columns searched by keyword; HTTP rows keep path, method, endpoint and user agent outside details.
+SEARCH_COLUMNS = ("message", "details", "resource_id", "method", "user_agent", "endpoint")
+_FTS_COLUMN_LIST = ", ".join(SEARCH_COLUMNS)
+_FTS_NEW_VALUES = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+_FTS_OLD_VALUES = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+
+# Trigram tokens give substring matches, which also works for Chinese text without word breaks.
+_FTS_SCHEMA = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS audit_logs_fts USING fts5(
+        {_FTS_COLUMN_LIST}, content='audit_logs', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS audit_logs_fts_ai AFTER INSERT ON audit_logs BEGIN
+        INSERT INTO audit_logs_fts (rowid, {_FTS_COLUMN_LIST}) VALUES (new.id, {_FTS_NEW_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS audit_logs_fts_ad AFTER DELETE ON audit_logs BEGIN
+        INSERT INTO audit_logs_fts (audit_logs_fts, rowid, {_FTS_COLUMN_LIST})
+        VALUES ('delete', old.id, {_FTS_OLD_VALUES});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS audit_logs_fts_au AFTER UPDATE ON audit_logs BEGIN
+        INSERT INTO audit_logs_fts (audit_logs_fts, rowid, {_FTS_COLUMN_LIST})
+        VALUES ('delete', old.id, {_FTS_OLD_VALUES});
+        INSERT INTO audit_logs_fts (rowid, {_FTS_COLUMN_LIST}) VALUES (new.id, {_FTS_NEW_VALUES});
+    END
+    """,
+)
+_FTS_DROP = (
+    "DROP TRIGGER IF EXISTS audit_logs_fts_ai",
+    "DROP TRIGGER IF EXISTS audit_logs_fts_ad",
+    "DROP TRIGGER IF EXISTS audit_logs_fts_au",
+    "DROP TABLE IF EXISTS audit_logs_fts",
+)
+_FTS_REBUILD = "INSERT INTO audit_logs_fts (audit_logs_fts) VALUES ('rebuild')"
 
 
 def _resolve_db_path() -> Path:
@@ -22,9 +71,15 @@ def _resolve_db_path() -> Path:
     return path
 
 
+def _configure(conn: sqlite3.Connection) -> None:
+    conn.execute("PRAGMA foreign_keys=ON;")
+    conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    conn.execute("PRAGMA busy_timeout=5000;")
+
+
 def _apply_schema(conn: sqlite3.Connection) -> None:
     conn.execute("PRAGMA journal_mode=WAL;")
-    conn.execute("PRAGMA foreign_keys=ON;")
     conn.executescript(
         """
         CREATE TABLE IF NOT EXISTS audit_logs (
@@ -40,27 +95,94 @@ def _apply_schema(conn: sqlite3.Connection) -> None:
             resource_id TEXT,
             status TEXT NOT NULL,
             message TEXT,
-            details TEXT
+            details TEXT,
+            method TEXT,
+            status_code INTEGER,
+            user_agent TEXT,
+            endpoint TEXT
         );
         CREATE INDEX IF NOT EXISTS idx_audit_logs_created_at
         ON audit_logs (created_at DESC);
+        CREATE INDEX IF NOT EXISTS idx_audit_logs_created_id
+        ON audit_logs (created_at DESC, id DESC);
         CREATE INDEX IF NOT EXISTS idx_audit_logs_action_type
         ON audit_logs (action_type);
         """
     )
+    _add_missing_columns(conn)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audit_logs_status_code ON audit_logs (status_code);")
     conn.commit()
+    _apply_fts_schema(conn)
+
+
+def _add_missing_columns(conn: sqlite3.Connection) -> None:
+    # Databases created before the HTTP request columns existed are upgraded in place.
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(audit_logs)")}
+    for column, column_type in _HTTP_COLUMNS:
+        if column in existing:
+            continue
+        try:
+            conn.execute(f"ALTER TABLE audit_logs ADD COLUMN {column} {column_type}")
+        except sqlite3.OperationalError as exc:
+            # Another worker may have added it between our table_info read and the ALTER.
+            if "duplicate column" not in str(exc):
+                raise
+
+
+def _fts_columns(conn: sqlite3.Connection) -> tuple[str, ...]:
+    return tuple(row[1] for row in conn.execute("PRAGMA table_info(audit_logs_fts)"))
+
+
+def _apply_fts_schema(conn: sqlite3.Connection) -> None:
+    global _FTS_ENABLED
+    if _fts_columns(conn) != SEARCH_COLUMNS:
+        try:
+            # IMMEDIATE takes the write lock up front, so when several workers start together
+            # only the first one creates (or upgrades) and backfills the index.
+            conn.execute("BEGIN IMMEDIATE")
+            current = _fts_columns(conn)
+            if current != SEARCH_COLUMNS:
+                if current:
+                    # Index built by an older release with fewer columns: recreate it.
+                    for statement in _FTS_DROP:
+                        conn.execute(statement)
+                for statement in _FTS_SCHEMA:
+                    conn.execute(statement)
+                conn.execute(_FTS_REBUILD)
+            conn.commit()
+        except sqlite3.OperationalError:
+            conn.rollback()
+            if _fts_columns(conn) != SEARCH_COLUMNS:
+                # SQLite built without FTS5 or the trigram tokenizer (< 3.34): keep LIKE search.
+                return
+    _FTS_ENABLED = True
 
 
 def get_connection() -> sqlite3.Connection:
-    global _CONNECTION
-    if _CONNECTION is None:
+    """Return this thread's connection to the audit log database."""
+    global _SCHEMA_READY
+    pid = os.getpid()
+    conn = getattr(_LOCAL, "connection", None)
+    # Connections inherited across fork() must not be reused by the child.
+    if conn is not None and _LOCAL.pid == pid:
+        return conn
+    conn = sqlite3.connect(_resolve_db_path(), check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    _configure(conn)
+    if not _SCHEMA_READY:
         with _LOCK:
-            if _CONNECTION is None:
-                conn = sqlite3.connect(_resolve_db_path(), check_same_thread=False)
-                conn.row_factory = sqlite3.Row
+            if not _SCHEMA_READY:
                 _apply_schema(conn)
-                _CONNECTION = conn
-    return _CONNECTION
+                _SCHEMA_READY = True
+    _LOCAL.connection = conn
+    _LOCAL.pid = pid
+    return conn
+
+
+def fts_enabled() -> bool:
+    """Whether keyword search can use the audit_logs_fts index."""
+    get_connection()
+    return _FTS_ENABLED
 
 
-__all__ = ["get_connection", "_CONNECTION"]
+__all__ = ["SEARCH_COLUMNS", "fts_enabled", "get_connection"]
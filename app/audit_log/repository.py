@@ -2,9 +2,11 @@
 from __future__ import annotations
 
 import json
-from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+from typing import Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
 
-from .database import get_connection
+import orjson
+
+from .database import SEARCH_COLUMNS, fts_enabled, get_connection
 
 _LOG_COLUMNS = (
     "action_type",
@@ -18,31 +20,56 @@ _LOG_COLUMNS = (
     "status",
     "message",
     "details",
+    "method",
+    "status_code",
+    "user_agent",
+    "endpoint",
+)
+# The trigram index cannot match search terms shorter than three characters.
+_FTS_MIN_KEYWORD_LENGTH = 3
+_INSERT_SQL = (
+    f"INSERT INTO audit_logs ({', '.join(_LOG_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in _LOG_COLUMNS)})"
 )
 
 
+def encode_details(metadata: object) -> Optional[str]:
+    if metadata is None:
+        return None
+    try:
+        return orjson.dumps(metadata, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+    except TypeError:
+        pass
+    # orjson rejects some values the stdlib accepts (e.g. integers wider than 64 bits).
+    try:
+        return json.dumps(metadata, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return json.dumps({"value": str(metadata)}, ensure_ascii=False)
+
+
 def insert_log(payload: Mapping[str, object]) -> int:
     conn = get_connection()
-    placeholders = ", ".join("?" for _ in _LOG_COLUMNS)
-    column_sql = ", ".join(_LOG_COLUMNS)
-    values = [payload.get(column) for column in _LOG_COLUMNS]
     with conn:
-        cursor = conn.execute(
-            f"""
-            INSERT INTO audit_logs ({column_sql})
-            VALUES ({placeholders})
-            """,
-            values,
-        )
+        cursor = conn.execute(_INSERT_SQL, tuple(payload.get(column) for column in _LOG_COLUMNS))
     return int(cursor.lastrowid)
 
 
+def insert_logs(payloads: Sequence[Mapping[str, object]]) -> None:
+    """Insert several rows in one transaction."""
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            _INSERT_SQL,
+            [tuple(payload.get(column) for column in _LOG_COLUMNS) for payload in payloads],
+        )
+
+
 def _row_to_dict(row) -> Dict[str, object]:
     details_raw = row["details"]
     parsed_details: Optional[object] = None
     if details_raw:
         try:
-            parsed_details = json.loads(details_raw)
+            parsed_details = orjson.loads(details_raw)
         except (TypeError, ValueError):
             parsed_details = details_raw
     return {
@@ -60,6 +87,10 @@ def _row_to_dict(row) -> Dict[str, object]:
         "message": row["message"],
         "details": parsed_details,
         "details_raw": details_raw,
+        "method": row["method"],
+        "status_code": row["status_code"],
+        "user_agent": row["user_agent"],
+        "endpoint": row["endpoint"],
     }
 
 
@@ -71,10 +102,14 @@ def _build_filters(
     channel: Optional[str] = None,
     resource_type: Optional[str] = None,
     resource_id: Optional[str] = None,
+    method: Optional[str] = None,
+    status_code: Optional[int] = None,
     start_time: Optional[str] = None,
     end_time: Optional[str] = None,
     keyword: Optional[str] = None,
 ) -> Tuple[str, List[object]]:
+    # created_at is always written by datetime('now'), so it compares as text against a
+    # normalized datetime(?) and the created_at index can serve range filters and ordering.
     conditions: List[str] = []
     params: List[object] = []
     if action_type:
@@ -95,16 +130,25 @@ def _build_filters(
     if resource_id:
         conditions.append("resource_id = ?")
         params.append(resource_id)
+    if method:
+        conditions.append("method = ?")
+        params.append(method.upper())
+    if status_code is not None:
+        conditions.append("status_code = ?")
+        params.append(status_code)
     if start_time:
-        conditions.append("datetime(created_at) >= datetime(?)")
+        conditions.append("created_at >= datetime(?)")
         params.append(start_time)
     if end_time:
-        conditions.append("datetime(created_at) <= datetime(?)")
+        conditions.append("created_at <= datetime(?)")
         params.append(end_time)
     if keyword:
-        conditions.append("(message LIKE ? OR details LIKE ?)")
-        like = f"%{keyword}%"
-        params.extend([like, like])
+        if len(keyword) >= _FTS_MIN_KEYWORD_LENGTH and fts_enabled():
+            conditions.append("id IN (SELECT rowid FROM audit_logs_fts WHERE audit_logs_fts MATCH ?)")
+            params.append('"' + keyword.replace('"', '""') + '"')
+        else:
+            conditions.append(" OR ".join(f"{column} LIKE ?" for column in SEARCH_COLUMNS))
+            params.extend([f"%{keyword}%"] * len(SEARCH_COLUMNS))
 
     where_clause = ""
     if conditions:
@@ -115,14 +159,21 @@ def _build_filters(
 def query_logs(
     limit: Optional[int],
     offset: int,
+    before: Optional[Tuple[str, int]] = None,
     **filters,
 ) -> List[Dict[str, object]]:
+    """Return rows newest first; ``before`` is a (created_at, id) keyset cursor that replaces offset."""
     where_clause, params = _build_filters(**filters)
+    if before is not None:
+        where_clause += " AND " if where_clause else "WHERE "
+        where_clause += "((created_at, id) < (?, ?))"
+        params.extend(before)
+        offset = 0
     sql = f"""
     SELECT *
     FROM audit_logs
     {where_clause}
-    ORDER BY datetime(created_at) DESC, id DESC
+    ORDER BY created_at DESC, id DESC
     """
     if limit is not None:
         sql += " LIMIT ? OFFSET ?"
@@ -144,10 +195,24 @@ def export_logs(**filters) -> List[Dict[str, object]]:
     return query_logs(limit=None, offset=0, **filters)
 
 
+def iter_logs(**filters) -> Iterator[Dict[str, object]]:
+    """Yield matching rows one at a time, newest first, without materializing the result."""
+    where_clause, params = _build_filters(**filters)
+    sql = f"""
+    SELECT *
+    FROM audit_logs
+    {where_clause}
+    ORDER BY created_at DESC, id DESC
+    """
+    conn = get_connection()
+    for row in conn.execute(sql, params):
+        yield _row_to_dict(row)
+
+
 def delete_logs(before_time: Optional[str] = None) -> int:
     conn = get_connection()
     if before_time:
-        sql = "DELETE FROM audit_logs WHERE datetime(created_at) <= datetime(?)"
+        sql = "DELETE FROM audit_logs WHERE created_at <= datetime(?)"
         params = (before_time,)
     else:
         sql = "DELETE FROM audit_logs"
@@ -157,4 +222,4 @@ def delete_logs(before_time: Optional[str] = None) -> int:
     return cursor.rowcount
 
 
-__all__ = ["insert_log", "query_logs", "count_logs", "export_logs", "delete_logs"]
+__all__ = ["encode_details", "insert_log", "query_logs", "count_logs", "export_logs", "iter_logs", "delete_logs"]
@@ -0,0 +1,104 @@
+"""Background thread that persists audit log entries off the request path."""
+from __future__ import annotations
+
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from . import repository
+
+_BATCH_MAX = max(1, int(os.getenv("AUDIT_LOG_BATCH_MAX", "64")))
+_BATCH_WINDOW = max(0.0, float(os.getenv("AUDIT_LOG_BATCH_MS", "50")) / 1000)
+
+_QUEUE_SIZE = max(1, int(os.getenv("AUDIT_LOG_QUEUE_SIZE", "10000")))
+
+_queue: "queue.Queue[Dict[str, object]]" = queue.Queue(maxsize=_QUEUE_SIZE)
+_thread: Optional[threading.Thread] = None
+_thread_pid: Optional[int] = None
+_start_lock = threading.Lock()
+
+
+def _report_failure(payload: Dict[str, object], exc: Exception) -> None:
+    print(f"[audit-log] Failed to record action '{payload.get('action_type')}': {exc}", file=sys.stderr)
+
+
+def _write(entries: List[Dict[str, object]]) -> None:
+    for payload in entries:
+        payload["details"] = repository.encode_details(payload.pop("metadata", None))
+    try:
+        repository.insert_logs(entries)
+        return
+    except Exception:  # pragma: no cover - retry row by row below
+        pass
+    # The batch rolled back as a whole; insert individually so one bad row does not drop the rest.
+    for payload in entries:
+        try:
+            repository.insert_log(payload)
+        except Exception as exc:  # pragma: no cover - logging fallback
+            _report_failure(payload, exc)
+
+
+def _drain(first: Dict[str, object]) -> List[Dict[str, object]]:
+    # Wait briefly for more rows so a burst of events is written in a single transaction.
+    entries = [first]
+    deadline = time.monotonic() + _BATCH_WINDOW
+    while len(entries) < _BATCH_MAX:
+        remaining = deadline - time.monotonic()
+        try:
+            if remaining > 0:
+                entries.append(_queue.get(timeout=remaining))
+            else:
+                entries.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    return entries
+
+
+def _run() -> None:
+    while True:
+        _write(_drain(_queue.get()))
+
+
+def _ensure_started() -> None:
+    global _thread, _thread_pid
+    pid = os.getpid()
+    if _thread is not None and _thread_pid == pid:
+        return
+    with _start_lock:
+        # Threads do not survive fork(); each Gunicorn worker starts its own writer.
+        if _thread is None or _thread_pid != pid:
+            _thread = threading.Thread(target=_run, name="audit-log-writer", daemon=True)
+            _thread.start()
+            _thread_pid = pid
+
+
+def enqueue(payload: Dict[str, object]) -> None:
+    """Queue an audit row for the writer thread."""
+    _ensure_started()
+    try:
+        _queue.put_nowait(payload)
+    except queue.Full:
+        # Back-pressure instead of dropping rows or growing without bound.
+        _write([payload])
+
+
+def flush() -> None:
+    """Write whatever is still queued on the calling thread (used at interpreter exit)."""
+    pending: List[Dict[str, object]] = []
+    while True:
+        try:
+            pending.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    if pending:
+        _write(pending)
+
+
+atexit.register(flush)
+
+
+__all__ = ["enqueue", "flush"]
@@ -1,18 +1,36 @@
 """Google Login 驗證與後台權限控制。"""
 from __future__ import annotations
 
+import hashlib
 import os
-from functools import wraps
-from typing import Callable, Dict, Optional, Set, Tuple
+import re
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from functools import lru_cache, wraps
+from typing import AbstractSet, Any, Callable, Dict, FrozenSet, Optional, Tuple
 
 from flask import Blueprint, abort, current_app, jsonify, request, session
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
 
 from .audit_log import record_action as audit_record_action
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
 
+_TOKEN_CACHE_TTL = 300.0
+_TOKEN_CACHE_SIZE = 1024
+# (client_id, sha256(credential)) -> (expires_at, token_info); only successful verifications are stored.
+_token_cache: "OrderedDict[Tuple[str, bytes], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+# Google rotates its signing certificates about once a day and states the lifetime in the headers.
+_CERTS_DEFAULT_TTL = 300.0
+# google-auth's own transport default; its certificate fetch passes no timeout of its own.
+_GOOGLE_REQUEST_TIMEOUT = 120.0
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+_certs_cache: Dict[str, Tuple[float, Any]] = {}
+_certs_cache_lock = threading.Lock()
+
 
 def _request_ip() -> Optional[str]:
     forwarded = request.headers.get("X-Forwarded-For")
@@ -62,34 +80,105 @@ def _log_auth_action(
     )
 
 
-def _split_env_list(value: Optional[str]) -> Set[str]:
+def _split_env_list(value: Optional[str]) -> FrozenSet[str]:
     if not value:
-        return set()
-    return {item.strip().lower() for item in value.split(",") if item.strip()}
+        return frozenset()
+    return frozenset(item.strip().lower() for item in value.split(",") if item.strip())
 
 
-def _get_settings() -> Tuple[str, Set[str], Set[str]]:
-    client_id = current_app.config.get("GOOGLE_CLIENT_ID") or os.getenv("GOOGLE_CLIENT_ID") or ""
-    allowed_emails = current_app.config.get("GOOGLE_ALLOWED_EMAILS")
-    allowed_domains = current_app.config.get("GOOGLE_ALLOWED_DOMAINS")
-    if not isinstance(allowed_emails, set):
+@lru_cache(maxsize=4)
+def _settings_for(app) -> Tuple[str, FrozenSet[str], FrozenSet[str]]:
+    client_id = app.config.get("GOOGLE_CLIENT_ID") or os.getenv("GOOGLE_CLIENT_ID") or ""
+    allowed_emails = app.config.get("GOOGLE_ALLOWED_EMAILS")
+    allowed_domains = app.config.get("GOOGLE_ALLOWED_DOMAINS")
+    # The app factory stores parsed frozensets; apps that do not set them fall back to the environment.
+    if allowed_emails is None:
         allowed_emails = _split_env_list(os.getenv("GOOGLE_ALLOWED_EMAILS"))
-    if not isinstance(allowed_domains, set):
+    if allowed_domains is None:
         allowed_domains = _split_env_list(os.getenv("GOOGLE_ALLOWED_DOMAINS"))
-    return client_id, allowed_emails, allowed_domains
+    return client_id, frozenset(allowed_emails), frozenset(allowed_domains)
+
 
+def _get_settings() -> Tuple[str, FrozenSet[str], FrozenSet[str]]:
+    # Settings are resolved once per app; call _settings_for.cache_clear() after changing them.
+    return _settings_for(current_app._get_current_object())
 
-def _is_authorized(email: Optional[str], allowed_emails: Set[str], allowed_domains: Set[str]) -> bool:
+
+def _is_authorized(email: Optional[str], allowed_emails: AbstractSet[str], allowed_domains: AbstractSet[str]) -> bool:
     if not email:
         return False
-    lowered = email.lower()
-    if allowed_emails and lowered in allowed_emails:
+    if not (allowed_emails or allowed_domains):
         return True
-    if allowed_domains:
-        domain = lowered.split("@")[-1]
-        if domain in allowed_domains:
-            return True
-    return not (allowed_emails or allowed_domains)
+    # Google usually returns lowercase addresses; islower() avoids allocating a copy for those.
+    lowered = email if email.islower() else email.lower()
+    return lowered in allowed_emails or lowered.rpartition("@")[2] in allowed_domains
+
+
+def _response_ttl(headers) -> float:
+    match = _MAX_AGE_PATTERN.search(headers.get("Cache-Control") or "")
+    if match:
+        return float(match.group(1))
+    expires = headers.get("Expires")
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp() - time.time()
+        except (TypeError, ValueError):
+            pass
+    return _CERTS_DEFAULT_TTL
+
+
+@lru_cache(maxsize=1)
+def _google_request() -> Callable:
+    """Transport for google-auth that keeps one HTTP session and caches certificate GETs."""
+    import requests
+    from google.auth.transport import requests as google_requests
+
+    transport = google_requests.Request(session=requests.Session())
+
+    def request(url, method="GET", body=None, headers=None, timeout=None, **kwargs):
+        if timeout is None:
+            timeout = _GOOGLE_REQUEST_TIMEOUT
+        if method != "GET" or body is not None:
+            return transport(url, method=method, body=body, headers=headers, timeout=timeout, **kwargs)
+        now = time.monotonic()
+        with _certs_cache_lock:
+            cached = _certs_cache.get(url)
+        if cached is not None and cached[0] > now:
+            return cached[1]
+        response = transport(url, method=method, headers=headers, timeout=timeout, **kwargs)
+        if response.status == 200:
+            ttl = _response_ttl(response.headers)
+            if ttl > 0:
+                with _certs_cache_lock:
+                    _certs_cache[url] = (now + ttl, response)
+        return response
+
+    return request
+
+
+def _verify_credential(credential: str, client_id: str) -> Dict[str, Any]:
+    """Verify a Google ID token, reusing the result for repeat submissions until it nears expiry."""
+    key = (client_id, hashlib.sha256(credential.encode("utf-8")).digest())
+    now = time.time()
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+        if cached is not None:
+            if cached[0] > now:
+                return cached[1]
+            del _token_cache[key]
+
+    # google-auth pulls in its RSA/crypto stack at import; only this endpoint needs it.
+    from google.oauth2 import id_token
+
+    token_info = id_token.verify_oauth2_token(credential, _google_request(), audience=client_id)
+    # Never keep a token past its own exp claim (with a little clock-skew margin).
+    ttl = min(_TOKEN_CACHE_TTL, float(token_info.get("exp") or 0) - now - 5)
+    if ttl > 0:
+        with _token_cache_lock:
+            _token_cache[key] = (now + ttl, token_info)
+            while len(_token_cache) > _TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return token_info
 
 
 def _build_user_payload(token_info: Dict[str, object]) -> Dict[str, object]:
@@ -151,11 +240,7 @@ def auth_login():
         abort(400, description="缺少 credential")
 
     try:
-        token_info = id_token.verify_oauth2_token(
-            credential,
-            google_requests.Request(),
-            audience=client_id,
-        )
+        token_info = _verify_credential(credential, client_id)
     except ValueError as exc:
         _log_auth_action(
             "auth.login",
@@ -23,6 +23,7 @@ from linebot.models import (
 )
 
 from .. import state
+from ..line_api import prebuild_messages
 from ..paths import CCTV_DATA_PATH
 
 
@@ -34,9 +35,12 @@ _MODE_LABELS = {
     "CCTV查詢：行政區": "district",
 }
 _CANCEL_KEYWORDS = {"取消", "結束", "退出", "取消CCTV查詢", "取消監視器查詢", "結束CCTV查詢", "退出CCTV查詢"}
+TRIGGER_KEYWORDS = frozenset(_TRIGGERS | _MODE_LABELS.keys())
+CANCEL_KEYWORDS = frozenset(_CANCEL_KEYWORDS)
 _COORD_PATTERN = re.compile(r"[-+]?\d+(?:\.\d+)?")
 _CLEAN_PATTERN = re.compile(r"[^\w\u4e00-\u9fff]+")
 _AREA_PATTERN = re.compile(r"[\u4e00-\u9fff]{1,6}[市縣區鄉鎮里村]")
+_KEYWORD_SPLIT_PATTERN = re.compile(r"[\s,，、/／]+")
 
 _DATA_PATH = CCTV_DATA_PATH
 
@@ -79,7 +83,7 @@ def _normalize_for_match(text: str) -> str:
 def _tokenize_keywords(text: str) -> List[str]:
     processed = unicodedata.normalize("NFKC", text or "")
     processed = processed.replace("台", "臺").lower()
-    chunks = re.split(r"[\s,，、/／]+", processed)
+    chunks = _KEYWORD_SPLIT_PATTERN.split(processed)
     tokens: List[str] = []
     for chunk in chunks:
         cleaned = _CLEAN_PATTERN.sub("", chunk)
@@ -161,17 +165,6 @@ def _load_cctv_entries() -> List[CCTVEntry]:
 _CCTV_ENTRIES = _load_cctv_entries()
 
 
-def _source_key(event: MessageEvent) -> str:
-    source = event.source
-    if getattr(source, "user_id", None):
-        return f"user:{source.user_id}"
-    if getattr(source, "group_id", None):
-        return f"group:{source.group_id}"
-    if getattr(source, "room_id", None):
-        return f"room:{source.room_id}"
-    return "unknown"
-
-
 def _build_entry_message() -> TextSendMessage:
     quick_reply = QuickReply(
         items=[
@@ -201,6 +194,12 @@ def _district_prompt() -> TextSendMessage:
     return TextSendMessage(text="請輸入縣市或行政區關鍵字，例：新北市 新店區 或 新店。")
 
 
+_ENTRY_MESSAGE = prebuild_messages(_build_entry_message())
+_COORDINATE_PROMPT = prebuild_messages(_coordinate_prompt())
+_NAME_PROMPT = prebuild_messages(_name_prompt())
+_DISTRICT_PROMPT = prebuild_messages(_district_prompt())
+
+
 def _format_distance(meters: float) -> str:
     if meters >= 1000:
         return f"{meters/1000:.1f} 公里"
@@ -270,7 +269,7 @@ def _reply_with_entries(
             TextSendMessage(text=link_text),
         ],
     )
-    state.set_topic(_source_key(event), None)
+    state.set_topic(state.source_key(event), None)
 
 
 def _ensure_data_ready(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
@@ -420,12 +419,12 @@ def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
     if not incoming_text:
         return False
 
-    source = _source_key(event)
+    source = state.source_key(event)
 
     if incoming_text in _TRIGGERS:
         state.set_topic(source, CHECK_CCTV_TOPIC)
         _SESSIONS.pop(source, None)
-        line_bot_api.reply_message(event.reply_token, _build_entry_message())
+        line_bot_api.reply_message(event.reply_token, _ENTRY_MESSAGE)
         return True
 
     if incoming_text in _CANCEL_KEYWORDS:
@@ -440,11 +439,11 @@ def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
         session = Session(mode=_MODE_LABELS[incoming_text], stage="awaiting_input")
         _SESSIONS[source] = session
         if session.mode == "coordinate":
-            line_bot_api.reply_message(event.reply_token, _coordinate_prompt())
+            line_bot_api.reply_message(event.reply_token, _COORDINATE_PROMPT)
         elif session.mode == "name":
-            line_bot_api.reply_message(event.reply_token, _name_prompt())
+            line_bot_api.reply_message(event.reply_token, _NAME_PROMPT)
         elif session.mode == "district":
-            line_bot_api.reply_message(event.reply_token, _district_prompt())
+            line_bot_api.reply_message(event.reply_token, _DISTRICT_PROMPT)
         return True
 
     if state.get_topic(source) != CHECK_CCTV_TOPIC:
@@ -457,7 +456,7 @@ def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
     if session.mode == "coordinate":
         lon, lat = _parse_coordinate_text(incoming_text)
         if lon is None or lat is None:
-            line_bot_api.reply_message(event.reply_token, _coordinate_prompt())
+            line_bot_api.reply_message(event.reply_token, _COORDINATE_PROMPT)
             return True
         return _handle_coordinate_query(event, line_bot_api, lon, lat)
 
@@ -471,7 +470,7 @@ def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
 
 
 def handle_location_message(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
-    source = _source_key(event)
+    source = state.source_key(event)
     session = _SESSIONS.get(source)
     if not session or session.mode != "coordinate":
         return False
@@ -482,4 +481,6 @@ __all__ = [
     "handle_message_event",
     "handle_location_message",
     "CHECK_CCTV_TOPIC",
+    "TRIGGER_KEYWORDS",
+    "CANCEL_KEYWORDS",
 ]
@@ -0,0 +1,19 @@
+"""Shared helpers for the demo topics."""
+from __future__ import annotations
+
+from typing import FrozenSet, Optional
+
+
+def match_handled_text(text: Optional[str], handled_texts: FrozenSet[str]) -> Optional[str]:
+    """Return the message text if a demo handles it, otherwise None.
+
+    Menu taps arrive without padding, so the text is only stripped when it does not match
+    as sent. Most chat text misses both lookups, letting the demos return before they touch
+    the source key or the topic lock.
+    """
+    if not text:
+        return None
+    if text in handled_texts:
+        return text
+    text = text.strip()
+    return text if text in handled_texts else None
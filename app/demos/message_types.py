@@ -1,7 +1,7 @@
 ﻿"""Message type demo topic helpers."""
 from __future__ import annotations
 
-from typing import Callable, Dict, List
+from typing import Callable, Dict, List, NamedTuple, Tuple
 
 from linebot import LineBotApi
 from linebot.models import (
@@ -28,20 +28,12 @@ from linebot.models import (
 )
 
 from .. import state
+from ..line_api import prebuild_messages
+from .common import match_handled_text
 
 
 DEMO_MESSAGE_TYPES_TOPIC = "Demo message types"
-
-
-def _source_key(event: MessageEvent) -> str:
-    source = event.source
-    if getattr(source, "user_id", None):
-        return f"user:{source.user_id}"
-    if getattr(source, "group_id", None):
-        return f"group:{source.group_id}"
-    if getattr(source, "room_id", None):
-        return f"room:{source.room_id}"
-    return "unknown"
+TRIGGER_KEYWORDS = frozenset({DEMO_MESSAGE_TYPES_TOPIC})
 
 
 def _intro_text(message: str) -> TextSendMessage:
@@ -138,203 +130,206 @@ def _build_template_demo() -> List[SendMessage]:
     ]
 
 
-def _build_flex_demo() -> List[SendMessage]:
-    container_bubble = {
-        "type": "bubble",
-        "header": {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-                {"type": "text", "text": "Container", "size": "sm", "color": "#aaaaaa"},
-                {"type": "text", "text": "Flex 容器類型", "weight": "bold", "size": "xl"},
-            ],
-        },
-        "body": {
-            "type": "box",
-            "layout": "vertical",
-            "spacing": "md",
-            "contents": [
-                {
-                    "type": "box",
-                    "layout": "baseline",
-                    "spacing": "sm",
-                    "contents": [
-                        {"type": "text", "text": "bubble", "flex": 2, "weight": "bold", "color": "#444444"},
-                        {
-                            "type": "text",
-                            "text": "單一版面，適合呈現焦點資訊與互動動作",
-                            "size": "sm",
-                            "wrap": True,
-                            "color": "#777777",
-                            "flex": 5,
-                        },
-                    ],
-                },
-                {
-                    "type": "box",
-                    "layout": "baseline",
-                    "spacing": "sm",
-                    "contents": [
-                        {"type": "text", "text": "carousel", "flex": 2, "weight": "bold", "color": "#444444"},
-                        {
-                            "type": "text",
-                            "text": "多個 bubble 組成，可滑動切換多個商品或步驟",
-                            "size": "sm",
-                            "wrap": True,
-                            "color": "#777777",
-                            "flex": 5,
-                        },
-                    ],
-                },
-                {"type": "separator"},
-                {
-                    "type": "text",
-                    "text": "容器決定 Flex Message 的載體與互動邏輯。",
-                    "size": "sm",
-                    "wrap": True,
-                },
-            ],
-        },
-        "footer": {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-                {
-                    "type": "button",
-                    "style": "primary",
-                    "action": {
-                        "type": "uri",
-                        "label": "容器說明",
-                        "uri": "https://developers.line.biz/en/docs/messaging-api/using-flex-messages/#flex-message-container",
+# Flex demo payloads are constant, so they are built once at import.
+_CONTAINER_BUBBLE = {
+    "type": "bubble",
+    "header": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {"type": "text", "text": "Container", "size": "sm", "color": "#aaaaaa"},
+            {"type": "text", "text": "Flex 容器類型", "weight": "bold", "size": "xl"},
+        ],
+    },
+    "body": {
+        "type": "box",
+        "layout": "vertical",
+        "spacing": "md",
+        "contents": [
+            {
+                "type": "box",
+                "layout": "baseline",
+                "spacing": "sm",
+                "contents": [
+                    {"type": "text", "text": "bubble", "flex": 2, "weight": "bold", "color": "#444444"},
+                    {
+                        "type": "text",
+                        "text": "單一版面，適合呈現焦點資訊與互動動作",
+                        "size": "sm",
+                        "wrap": True,
+                        "color": "#777777",
+                        "flex": 5,
                     },
-                }
-            ],
-        },
-    }
-
-    block_bubble = {
-        "type": "bubble",
-        "header": {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-                {"type": "text", "text": "Block", "size": "sm", "color": "#aaaaaa"},
-                {"type": "text", "text": "版面區塊", "weight": "bold", "size": "xl"},
-            ],
-        },
-        "body": {
-            "type": "box",
-            "layout": "vertical",
-            "spacing": "md",
-            "contents": [
-                {
-                    "type": "box",
-                    "layout": "baseline",
-                    "contents": [
-                        {"type": "text", "text": "header", "flex": 2, "color": "#555555"},
-                        {"type": "text", "text": "呈現標題、階段或狀態列", "flex": 5, "size": "sm", "wrap": True},
-                    ],
-                },
-                {
-                    "type": "box",
-                    "layout": "baseline",
-                    "contents": [
-                        {"type": "text", "text": "hero", "flex": 2, "color": "#555555"},
-                        {"type": "text", "text": "大圖或影片吸引目光", "flex": 5, "size": "sm", "wrap": True},
-                    ],
-                },
-                {
-                    "type": "box",
-                    "layout": "baseline",
-                    "contents": [
-                        {"type": "text", "text": "body", "flex": 2, "color": "#555555"},
-                        {"type": "text", "text": "主要敘述、欄位與列表", "flex": 5, "size": "sm", "wrap": True},
-                    ],
-                },
-                {
-                    "type": "box",
-                    "layout": "baseline",
-                    "contents": [
-                        {"type": "text", "text": "footer", "flex": 2, "color": "#555555"},
-                        {"type": "text", "text": "操作按鈕或補充資訊", "flex": 5, "size": "sm", "wrap": True},
-                    ],
-                },
-                {"type": "separator"},
-                {
-                    "type": "text",
-                    "text": "亦可利用 styles 統一背景與字色。",
-                    "size": "sm",
-                    "wrap": True,
-                },
-            ],
-        },
-        "footer": {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-                {
-                    "type": "button",
-                    "style": "link",
-                    "height": "sm",
-                    "action": {
-                        "type": "uri",
-                        "label": "Block 範例",
-                        "uri": "https://developers.line.biz/en/docs/messaging-api/using-flex-messages/#bubble",
+                ],
+            },
+            {
+                "type": "box",
+                "layout": "baseline",
+                "spacing": "sm",
+                "contents": [
+                    {"type": "text", "text": "carousel", "flex": 2, "weight": "bold", "color": "#444444"},
+                    {
+                        "type": "text",
+                        "text": "多個 bubble 組成，可滑動切換多個商品或步驟",
+                        "size": "sm",
+                        "wrap": True,
+                        "color": "#777777",
+                        "flex": 5,
                     },
-                }
-            ],
-        },
-    }
-
-    component_bubble = {
-        "type": "bubble",
-        "header": {
-            "type": "box",
-            "layout": "vertical",
-            "contents": [
-                {"type": "text", "text": "Component", "size": "sm", "color": "#aaaaaa"},
-                {"type": "text", "text": "元件組合", "weight": "bold", "size": "xl"},
-            ],
-        },
-        "body": {
-            "type": "box",
-            "layout": "vertical",
-            "spacing": "md",
-            "contents": [
-                {"type": "text", "text": "常見元件：", "size": "sm"},
-                {
-                    "type": "box",
-                    "layout": "vertical",
-                    "spacing": "sm",
-                    "contents": [
-                        {"type": "text", "text": "• text / span：呈現標題與段落", "size": "sm", "wrap": True},
-                        {"type": "text", "text": "• image / icon：圖片與圖示", "size": "sm", "wrap": True},
-                        {"type": "text", "text": "• button / link：行動按鈕", "size": "sm", "wrap": True},
-                        {"type": "text", "text": "• box：彈性排版容器", "size": "sm", "wrap": True},
-                        {"type": "text", "text": "• separator / spacer / filler：分隔與留白", "size": "sm", "wrap": True},
-                    ],
+                ],
+            },
+            {"type": "separator"},
+            {
+                "type": "text",
+                "text": "容器決定 Flex Message 的載體與互動邏輯。",
+                "size": "sm",
+                "wrap": True,
+            },
+        ],
+    },
+    "footer": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {
+                "type": "button",
+                "style": "primary",
+                "action": {
+                    "type": "uri",
+                    "label": "容器說明",
+                    "uri": "https://developers.line.biz/en/docs/messaging-api/using-flex-messages/#flex-message-container",
                 },
-                {"type": "separator"},
-                {
-                    "type": "button",
-                    "style": "secondary",
-                    "action": {
-                        "type": "uri",
-                        "label": "查看所有元件",
-                        "uri": "https://developers.line.biz/en/docs/messaging-api/using-flex-messages/#component",
-                    },
+            }
+        ],
+    },
+}
+
+_BLOCK_BUBBLE = {
+    "type": "bubble",
+    "header": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {"type": "text", "text": "Block", "size": "sm", "color": "#aaaaaa"},
+            {"type": "text", "text": "版面區塊", "weight": "bold", "size": "xl"},
+        ],
+    },
+    "body": {
+        "type": "box",
+        "layout": "vertical",
+        "spacing": "md",
+        "contents": [
+            {
+                "type": "box",
+                "layout": "baseline",
+                "contents": [
+                    {"type": "text", "text": "header", "flex": 2, "color": "#555555"},
+                    {"type": "text", "text": "呈現標題、階段或狀態列", "flex": 5, "size": "sm", "wrap": True},
+                ],
+            },
+            {
+                "type": "box",
+                "layout": "baseline",
+                "contents": [
+                    {"type": "text", "text": "hero", "flex": 2, "color": "#555555"},
+                    {"type": "text", "text": "大圖或影片吸引目光", "flex": 5, "size": "sm", "wrap": True},
+                ],
+            },
+            {
+                "type": "box",
+                "layout": "baseline",
+                "contents": [
+                    {"type": "text", "text": "body", "flex": 2, "color": "#555555"},
+                    {"type": "text", "text": "主要敘述、欄位與列表", "flex": 5, "size": "sm", "wrap": True},
+                ],
+            },
+            {
+                "type": "box",
+                "layout": "baseline",
+                "contents": [
+                    {"type": "text", "text": "footer", "flex": 2, "color": "#555555"},
+                    {"type": "text", "text": "操作按鈕或補充資訊", "flex": 5, "size": "sm", "wrap": True},
+                ],
+            },
+            {"type": "separator"},
+            {
+                "type": "text",
+                "text": "亦可利用 styles 統一背景與字色。",
+                "size": "sm",
+                "wrap": True,
+            },
+        ],
+    },
+    "footer": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {
+                "type": "button",
+                "style": "link",
+                "height": "sm",
+                "action": {
+                    "type": "uri",
+                    "label": "Block 範例",
+                    "uri": "https://developers.line.biz/en/docs/messaging-api/using-flex-messages/#bubble",
                 },
-            ],
-        },
-    }
+            }
+        ],
+    },
+}
 
-    flex_contents = {
-        "type": "carousel",
-        "contents": [container_bubble, block_bubble, component_bubble],
-    }
+_COMPONENT_BUBBLE = {
+    "type": "bubble",
+    "header": {
+        "type": "box",
+        "layout": "vertical",
+        "contents": [
+            {"type": "text", "text": "Component", "size": "sm", "color": "#aaaaaa"},
+            {"type": "text", "text": "元件組合", "weight": "bold", "size": "xl"},
+        ],
+    },
+    "body": {
+        "type": "box",
+        "layout": "vertical",
+        "spacing": "md",
+        "contents": [
+            {"type": "text", "text": "常見元件：", "size": "sm"},
+            {
+                "type": "box",
+                "layout": "vertical",
+                "spacing": "sm",
+                "contents": [
+                    {"type": "text", "text": "• text / span：呈現標題與段落", "size": "sm", "wrap": True},
+                    {"type": "text", "text": "• image / icon：圖片與圖示", "size": "sm", "wrap": True},
+                    {"type": "text", "text": "• button / link：行動按鈕", "size": "sm", "wrap": True},
+                    {"type": "text", "text": "• box：彈性排版容器", "size": "sm", "wrap": True},
+                    {"type": "text", "text": "• separator / spacer / filler：分隔與留白", "size": "sm", "wrap": True},
+                ],
+            },
+            {"type": "separator"},
+            {
+                "type": "button",
+                "style": "secondary",
+                "action": {
+                    "type": "uri",
+                    "label": "查看所有元件",
+                    "uri": "https://developers.line.biz/en/docs/messaging-api/using-flex-messages/#component",
+                },
+            },
+        ],
+    },
+}
+
+_FLEX_CONTENTS = {
+    "type": "carousel",
+    "contents": [_CONTAINER_BUBBLE, _BLOCK_BUBBLE, _COMPONENT_BUBBLE],
+}
+
+
+def _build_flex_demo() -> List[SendMessage]:
     return [
         _intro_text("以下示範 Flex Message 的 Container、Block 與 Component 結構。"),
-        FlexSendMessage(alt_text="Flex Message 結構示範", contents=flex_contents),
+        FlexSendMessage(alt_text="Flex Message 結構示範", contents=_FLEX_CONTENTS),
     ]
 
 
@@ -349,94 +344,74 @@ _OPTION_BUILDERS: Dict[str, Callable[[], List[SendMessage]]] = {
     "訊息類型：樣板": _build_template_demo,
     "訊息類型：Flex": _build_flex_demo,
 }
+# None of the demos depend on the event, so each reply is built and serialized once.
+_OPTION_MESSAGES: Dict[str, Tuple[SendMessage, ...]] = {
+    text: prebuild_messages(tuple(builder())) for text, builder in _OPTION_BUILDERS.items()
+}
+_HANDLED_TEXTS = frozenset(_OPTION_MESSAGES) | TRIGGER_KEYWORDS
 
-_QUICK_REPLY_ITEMS = [
-    {
-        "label": "文字",
-        "text": "訊息類型：文字",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/01_2_restaurant.png",
-    },
-    {
-        "label": "貼圖",
-        "text": "訊息類型：貼圖",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/sticker/01.png",
-    },
-    {
-        "label": "圖片",
-        "text": "訊息類型：圖片",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/01_1_cafe.png",
-    },
-    {
-        "label": "影片",
-        "text": "訊息類型：影片",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/03_1_movie.png",
-    },
-    {
-        "label": "語音",
-        "text": "訊息類型：語音",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/03_2_music.png",
-    },
-    {
-        "label": "位置",
-        "text": "訊息類型：位置",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/04_1_tap.png",
-    },
-    {
-        "label": "互動圖片",
-        "text": "訊息類型：互動圖片",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/02_2_question.png",
-    },
-    {
-        "label": "樣板",
-        "text": "訊息類型：樣板",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/02_1_birthday.png",
-    },
-    {
-        "label": "Flex",
-        "text": "訊息類型：Flex",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/01_5_carousel.png",
-    },
-]
+
+class _QuickReplyItem(NamedTuple):
+    label: str
+    text: str
+    icon: str
+
+
+_FX_ICON_URL = "https://scdn.line-apps.com/n/channel_devcenter/img/fx/"
+
+_QUICK_REPLY_ITEMS = (
+    _QuickReplyItem("文字", "訊息類型：文字", _FX_ICON_URL + "01_2_restaurant.png"),
+    _QuickReplyItem("貼圖", "訊息類型：貼圖", "https://scdn.line-apps.com/n/channel_devcenter/img/sticker/01.png"),
+    _QuickReplyItem("圖片", "訊息類型：圖片", _FX_ICON_URL + "01_1_cafe.png"),
+    _QuickReplyItem("影片", "訊息類型：影片", _FX_ICON_URL + "03_1_movie.png"),
+    _QuickReplyItem("語音", "訊息類型：語音", _FX_ICON_URL + "03_2_music.png"),
+    _QuickReplyItem("位置", "訊息類型：位置", _FX_ICON_URL + "04_1_tap.png"),
+    _QuickReplyItem("互動圖片", "訊息類型：互動圖片", _FX_ICON_URL + "02_2_question.png"),
+    _QuickReplyItem("樣板", "訊息類型：樣板", _FX_ICON_URL + "02_1_birthday.png"),
+    _QuickReplyItem("Flex", "訊息類型：Flex", _FX_ICON_URL + "01_5_carousel.png"),
+)
+
+# Buttons and their actions are built once; serializing them never mutates the models.
+_QUICK_REPLY_BUTTONS = tuple(
+    QuickReplyButton(action=MessageAction(label=item.label, text=item.text), image_url=item.icon)
+    for item in _QUICK_REPLY_ITEMS
+)
 
 
 def build_message_types_quick_reply() -> TextSendMessage:
     """Construct quick reply menu listing available message type demos."""
-    quick_reply = QuickReply(
-        items=[
-            QuickReplyButton(
-                action=MessageAction(label=item["label"], text=item["text"]),
-                image_url=item.get("icon"),
-            )
-            for item in _QUICK_REPLY_ITEMS
-        ]
-    )
+    quick_reply = QuickReply(items=list(_QUICK_REPLY_BUTTONS))
     return TextSendMessage(
         text="這是 LINE 訊息類型示範，請挑選想體驗的訊息。",
         quick_reply=quick_reply,
     )
 
 
+_MESSAGE_TYPES_MENU = prebuild_messages(build_message_types_quick_reply())
+
+
 def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
     """Handle text messages related to the message type demo."""
-    incoming_text = (event.message.text or "").strip()
-    source = _source_key(event)
+    incoming_text = match_handled_text(event.message.text, _HANDLED_TEXTS)
+    if incoming_text is None:
+        return False
+    source = state.source_key(event)
 
     if incoming_text == DEMO_MESSAGE_TYPES_TOPIC:
         state.set_topic(source, DEMO_MESSAGE_TYPES_TOPIC)
         line_bot_api.reply_message(
             event.reply_token,
-            build_message_types_quick_reply(),
+            _MESSAGE_TYPES_MENU,
         )
         return True
 
     if state.get_topic(source) != DEMO_MESSAGE_TYPES_TOPIC:
         return False
 
-    builder = _OPTION_BUILDERS.get(incoming_text)
-    if builder is None:
+    messages = _OPTION_MESSAGES.get(incoming_text)
+    if messages is None:
         return False
 
-    messages = builder()
     state.set_topic(source, DEMO_MESSAGE_TYPES_TOPIC)
     line_bot_api.reply_message(event.reply_token, messages)
     return True
@@ -1,11 +1,13 @@
 ﻿"""Quick reply demo topic helpers."""
 from __future__ import annotations
 
-from typing import Dict
-from urllib.parse import parse_qs
+from functools import lru_cache
+from typing import Dict, NamedTuple, Tuple
+from urllib.parse import unquote_plus
 
 from linebot import LineBotApi
 from linebot.models import (
+    Action,
     CameraAction,
     CameraRollAction,
     DatetimePickerAction,
@@ -21,114 +23,100 @@ from linebot.models import (
 )
 
 from .. import state
+from ..line_api import prebuild_messages
+from .common import match_handled_text
 
 
 DEMO_QUICK_REPLY_TOPIC = "Demo quick replies"
 DEMO_QUICK_REPLY_TOPIC_KEY = "demo_quick_replies"
+TRIGGER_KEYWORDS = frozenset({DEMO_QUICK_REPLY_TOPIC})
 
 
-def _source_key(event: MessageEvent) -> str:
-    source = event.source
-    if getattr(source, "user_id", None):
-        return f"user:{source.user_id}"
-    if getattr(source, "group_id", None):
-        return f"group:{source.group_id}"
-    if getattr(source, "room_id", None):
-        return f"room:{source.room_id}"
-    return "unknown"
-
-_QUICK_REPLY_ITEMS = [
-    {
-        "label": "文字訊息",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/01_2_restaurant.png",
-        "action": MessageAction(label="文字訊息", text="示範：文字訊息"),
-        "ack_text": "您選擇了 文字訊息（MessageAction）",
-    },
-    {
-        "label": "資料回傳",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/01_1_cafe.png",
-        "action": PostbackAction(
+class _QuickReplyItem(NamedTuple):
+    action: Action
+    icon: str
+
+
+_FX_ICON_URL = "https://scdn.line-apps.com/n/channel_devcenter/img/fx/"
+
+_QUICK_REPLY_ITEMS = (
+    _QuickReplyItem(
+        MessageAction(label="文字訊息", text="示範：文字訊息"),
+        _FX_ICON_URL + "01_2_restaurant.png",
+    ),
+    _QuickReplyItem(
+        PostbackAction(
             label="資料回傳",
             data=f"topic={DEMO_QUICK_REPLY_TOPIC_KEY}&choice=資料回傳",
             display_text="示範：資料回傳",
         ),
-        "ack_text": "您選擇了 資料回傳（PostbackAction）",
-        "postback_choice": "資料回傳",
-    },
-    {
-        "label": "日期時間",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/02_1_birthday.png",
-        "action": DatetimePickerAction(
+        _FX_ICON_URL + "01_1_cafe.png",
+    ),
+    _QuickReplyItem(
+        DatetimePickerAction(
             label="日期時間",
             data=f"topic={DEMO_QUICK_REPLY_TOPIC_KEY}&choice=日期時間",
             mode="datetime",
         ),
-        "ack_text": "您選擇了 日期時間（DatetimePickerAction）",
-        "postback_choice": "日期時間",
-    },
-    {
-        "label": "開啟連結",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/02_2_question.png",
-        "action": URIAction(label="開啟連結", uri="https://example.com"),
-    },
-    {
-        "label": "開啟相機",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/03_1_movie.png",
-        "action": CameraAction(label="開啟相機"),
-    },
-    {
-        "label": "相簿照片",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/03_2_music.png",
-        "action": CameraRollAction(label="相簿照片"),
-    },
-    {
-        "label": "分享位置",
-        "icon": "https://scdn.line-apps.com/n/channel_devcenter/img/fx/04_1_tap.png",
-        "action": LocationAction(label="分享位置"),
-    },
-]
+        _FX_ICON_URL + "02_1_birthday.png",
+    ),
+    _QuickReplyItem(URIAction(label="開啟連結", uri="https://example.com"), _FX_ICON_URL + "02_2_question.png"),
+    _QuickReplyItem(CameraAction(label="開啟相機"), _FX_ICON_URL + "03_1_movie.png"),
+    _QuickReplyItem(CameraRollAction(label="相簿照片"), _FX_ICON_URL + "03_2_music.png"),
+    _QuickReplyItem(LocationAction(label="分享位置"), _FX_ICON_URL + "04_1_tap.png"),
+)
 
 _MESSAGE_ACTION_RESPONSES: Dict[str, str] = {
-    item["action"].text: item["ack_text"]
-    for item in _QUICK_REPLY_ITEMS
-    if isinstance(item["action"], MessageAction) and item.get("ack_text")
+    "示範：文字訊息": "您選擇了 文字訊息（MessageAction）",
 }
 
 _POSTBACK_RESPONSE_BY_CHOICE: Dict[str, str] = {
-    item["postback_choice"]: item["ack_text"]
-    for item in _QUICK_REPLY_ITEMS
-    if item.get("postback_choice")
+    "資料回傳": "您選擇了 資料回傳（PostbackAction）",
+    "日期時間": "您選擇了 日期時間（DatetimePickerAction）",
 }
 
+_HANDLED_TEXTS = frozenset(_MESSAGE_ACTION_RESPONSES) | TRIGGER_KEYWORDS
+
+
+# Buttons are built once; serializing them never mutates the models.
+_QUICK_REPLY_BUTTONS = tuple(
+    QuickReplyButton(action=item.action, image_url=item.icon) for item in _QUICK_REPLY_ITEMS
+)
+
 
 def build_quick_reply_message() -> TextSendMessage:
     """Construct a quick reply menu demonstrating supported action types."""
-    quick_reply = QuickReply(
-        items=[
-            QuickReplyButton(
-                action=item["action"],
-                image_url=item.get("icon"),
-            )
-            for item in _QUICK_REPLY_ITEMS
-        ]
-    )
+    quick_reply = QuickReply(items=list(_QUICK_REPLY_BUTTONS))
     return TextSendMessage(
         text="這是 LINE 快速回覆動作示範，請選擇一個項目。",
         quick_reply=quick_reply,
     )
 
 
+_QUICK_REPLY_MESSAGE = prebuild_messages(build_quick_reply_message())
+
+
+@lru_cache(maxsize=512)
+def _parse_postback(data: str) -> Tuple[str, str]:
+    # Only two keys are read, so skip parse_qs and its dict of lists; the first value wins as before.
+    fields: Dict[str, str] = {}
+    for pair in data.split("&"):
+        key, sep, value = pair.partition("=")
+        if sep and value and key not in fields:
+            fields[key] = value
+    return unquote_plus(fields.get("topic", "")), unquote_plus(fields.get("choice", ""))
+
+
 def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
     """Handle text messages related to the quick reply demo."""
-    incoming_text = (event.message.text or "").strip()
-    source = _source_key(event)
+    incoming_text = match_handled_text(event.message.text, _HANDLED_TEXTS)
+    if incoming_text is None:
+        return False
+    source = state.source_key(event)
 
     if incoming_text == DEMO_QUICK_REPLY_TOPIC:
         state.set_topic(source, DEMO_QUICK_REPLY_TOPIC)
-        line_bot_api.reply_message(
-            event.reply_token,
-            build_quick_reply_message(),
-        )
+        line_bot_api.reply_message(event.reply_token, _QUICK_REPLY_MESSAGE)
         return True
 
     if state.get_topic(source) != DEMO_QUICK_REPLY_TOPIC:
@@ -150,14 +138,12 @@ def handle_postback_event(event: PostbackEvent, line_bot_api: LineBotApi) -> boo
     if not data:
         return False
 
-    params = parse_qs(data)
-    topic = params.get("topic", [""])[0]
-    choice = params.get("choice", [""])[0]
+    topic, choice = _parse_postback(data)
 
     if topic != DEMO_QUICK_REPLY_TOPIC_KEY or not choice:
         return False
 
-    source = _source_key(event)
+    source = state.source_key(event)
     state.set_topic(source, DEMO_QUICK_REPLY_TOPIC)
 
     base_text = _POSTBACK_RESPONSE_BY_CHOICE.get(choice, f"您選擇了 {choice}")
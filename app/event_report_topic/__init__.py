@@ -1,14 +1,18 @@
 """LINE 事件回報模組。"""
 from __future__ import annotations
 
+import logging
+import math
 import mimetypes
 import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
 from dataclasses import dataclass, field
-from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Sequence, Tuple
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
-from uuid import uuid4
 
 from linebot import LineBotApi
 from linebot.exceptions import LineBotApiError
@@ -25,6 +29,7 @@ from linebot.models import (
 )
 
 from .. import state
+from ..line_api import prebuild_messages
 from . import repository
 from .models import ReportEventRecord
 from .public import get_public_page_url
@@ -37,6 +42,8 @@ from .photos import serialize_photo_field
 REPORT_EVENT_TOPIC = "Report event"
 _TRIGGERS = {"回報事件", "事件回報", "災情回報"}
 _CANCEL_KEYWORDS = {"取消", "結束", "退出", "取消事件回報", "結束事件回報", "退出事件回報"}
+TRIGGER_KEYWORDS = frozenset(_TRIGGERS)
+CANCEL_KEYWORDS = frozenset(_CANCEL_KEYWORDS)
 _CONFIRM_YES = {"是", "是的", "確認", "沒問題", "ok", "ok的", "ＯＫ"}
 _CONFIRM_NO = {"否", "不是", "重新輸入", "不正確", "否定"}
 
@@ -47,11 +54,14 @@ _ROUTE_LINES_LEFT_RIGHT = {"平溪線", "深澳線"}
 _ROUTE_LINES_EAST_WEST = {"宜蘭線", "北迴線"}
 _LEFT_RIGHT_CHOICES = ["左", "右"]
 _EAST_WEST_CHOICES = ["東", "西"]
-_MILEAGE_PATTERN = re.compile(r"^(?:k|K)?\s*(\d+)(?:\+(\d+))?$")
 _COORD_PATTERN = re.compile(r"[-+]?\d+(?:\.\d+)?")
+_COORD_SEPARATORS = str.maketrans({"，": ",", "、": ",", "；": ",", " ": None})
 _PHOTO_DONE_KEYWORDS = {"完成", "完成上傳", "上傳完成", "好了", "結束上傳"}
 
 _PICTURE_DIR = EVENT_PICTURES_DIR
+_PHOTO_CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
 
 
 def _append_query_params(base_url: str, params: Dict[str, object]) -> str:
@@ -80,14 +90,29 @@ def _event_public_link(base_url: str, record: ReportEventRecord) -> str:
 
 
 def _normalize_text(text: str) -> str:
-    return re.sub(r"\s+", "", (text or "")).lower()
-
-
-_TRIGGER_TOKENS = {_normalize_text(item) for item in _TRIGGERS}
-_CANCEL_TOKENS = {_normalize_text(item) for item in _CANCEL_KEYWORDS}
-_CONFIRM_YES_TOKENS = {_normalize_text(item) for item in _CONFIRM_YES}
-_CONFIRM_NO_TOKENS = {_normalize_text(item) for item in _CONFIRM_NO}
-_PHOTO_DONE_TOKENS = {_normalize_text(item) for item in _PHOTO_DONE_KEYWORDS}
+    # str.split() drops exactly the characters regex \s matches, without going through the regex engine.
+    return "".join((text or "").split()).lower()
+
+
+_ACTION_CANCEL = "cancel"
+_ACTION_TRIGGER = "trigger"
+_ACTION_CONFIRM_YES = "confirm_yes"
+_ACTION_CONFIRM_NO = "confirm_no"
+_ACTION_PHOTO_DONE = "photo_done"
+
+# Normalized keyword -> action, so each message is hashed once. Listed from lowest to highest
+# precedence: a keyword in several groups keeps the later (cancel wins over everything).
+_KEYWORD_ACTIONS: Dict[str, str] = {
+    _normalize_text(item): action
+    for action, keywords in (
+        (_ACTION_PHOTO_DONE, _PHOTO_DONE_KEYWORDS),
+        (_ACTION_CONFIRM_NO, _CONFIRM_NO),
+        (_ACTION_CONFIRM_YES, _CONFIRM_YES),
+        (_ACTION_TRIGGER, _TRIGGERS),
+        (_ACTION_CANCEL, _CANCEL_KEYWORDS),
+    )
+    for item in keywords
+}
 
 
 def _cancel_button() -> QuickReplyButton:
@@ -104,7 +129,7 @@ def _confirm_quick_reply() -> QuickReply:
     )
 
 
-@dataclass
+@dataclass(slots=True)
 class Session:
     stage: str
     event_type: Optional[str] = None
@@ -118,31 +143,50 @@ class Session:
     latitude: Optional[float] = None
     location_title: Optional[str] = None
     location_address: Optional[str] = None
+    last_touch: float = field(default_factory=time.monotonic)
 
 
-_SESSIONS: Dict[str, Session] = {}
+# Reports abandoned half-way would otherwise stay in memory forever; keep the map bounded.
+_SESSION_TTL_SECONDS = 30 * 60
+_MAX_SESSIONS = 10_000
 
+_SESSIONS: "OrderedDict[str, Session]" = OrderedDict()
+_SESSIONS_LOCK = threading.Lock()
 
-def _source_key(event: MessageEvent) -> str:
-    source = event.source
-    if getattr(source, "user_id", None):
-        return f"user:{source.user_id}"
-    if getattr(source, "group_id", None):
-        return f"group:{source.group_id}"
-    if getattr(source, "room_id", None):
-        return f"room:{source.room_id}"
-    return "unknown"
+
+def _evict_sessions(now: float) -> None:
+    # Entries are kept in last-touch order, so expired sessions are always at the front.
+    while _SESSIONS:
+        oldest = next(iter(_SESSIONS.values()))
+        if now - oldest.last_touch <= _SESSION_TTL_SECONDS and len(_SESSIONS) <= _MAX_SESSIONS:
+            break
+        _SESSIONS.popitem(last=False)
 
 
 def _set_session(key: str, session: Optional[Session]) -> None:
-    if session is None:
-        _SESSIONS.pop(key, None)
-    else:
+    with _SESSIONS_LOCK:
+        if session is None:
+            _SESSIONS.pop(key, None)
+            return
+        now = time.monotonic()
+        session.last_touch = now
         _SESSIONS[key] = session
+        _SESSIONS.move_to_end(key)
+        _evict_sessions(now)
 
 
-def _get_session(event: MessageEvent) -> Optional[Session]:
-    return _SESSIONS.get(_source_key(event))
+def _get_session(key: str) -> Optional[Session]:
+    now = time.monotonic()
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(key)
+        if session is None:
+            return None
+        if now - session.last_touch > _SESSION_TTL_SECONDS:
+            del _SESSIONS[key]
+            return None
+        session.last_touch = now
+        _SESSIONS.move_to_end(key)
+    return session
 
 
 def _build_quick_reply(options: Sequence[str]) -> QuickReply:
@@ -154,114 +198,91 @@ def _build_quick_reply(options: Sequence[str]) -> QuickReply:
     return QuickReply(items=items)
 
 
-def _start_session(event: MessageEvent, line_bot_api: LineBotApi) -> None:
-    key = _source_key(event)
+def _photo_quick_reply() -> QuickReply:
+    return QuickReply(
+        items=[
+            QuickReplyButton(action=CameraAction(label="拍照")),
+            QuickReplyButton(action=CameraRollAction(label="相簿")),
+            QuickReplyButton(action=MessageAction(label="完成", text="完成")),
+            _cancel_button(),
+        ]
+    )
+
+
+# Quick replies shared by dynamic messages; none of them depend on the session.
+_CONFIRM_QUICK_REPLY = _confirm_quick_reply()
+_PHOTO_QUICK_REPLY = _photo_quick_reply()
+
+_EVENT_TYPE_PROMPT = prebuild_messages(
+    TextSendMessage(text="請選擇要回報的事件類型：", quick_reply=_build_quick_reply(_EVENT_TYPES))
+)
+_LOCATION_METHOD_PROMPT = prebuild_messages(
+    TextSendMessage(text="請分享事件地點：", quick_reply=_build_quick_reply(_LOCATION_METHOD_OPTIONS))
+)
+_COORDINATE_PROMPT = prebuild_messages(
+    TextSendMessage(
+        text="請分享位置或輸入經緯度坐標（例如 121.123, 24.123）：",
+        quick_reply=QuickReply(
+            items=[
+                QuickReplyButton(action=LocationAction(label="分享位置")),
+                _cancel_button(),
+            ]
+        ),
+    )
+)
+_ROUTE_LINE_PROMPT = prebuild_messages(
+    TextSendMessage(text="請選擇軌道路線別：", quick_reply=_build_quick_reply(_ROUTE_LINES))
+)
+_LEFT_RIGHT_PROMPT = prebuild_messages(
+    TextSendMessage(text="請選擇邊別：", quick_reply=_build_quick_reply(_LEFT_RIGHT_CHOICES))
+)
+_EAST_WEST_PROMPT = prebuild_messages(
+    TextSendMessage(text="請選擇正線：", quick_reply=_build_quick_reply(_EAST_WEST_CHOICES))
+)
+_TRACK_SIDE_FALLBACK_PROMPT = prebuild_messages(
+    TextSendMessage(text="請選擇邊別／正線：", quick_reply=_build_quick_reply(_EAST_WEST_CHOICES))
+)
+_MILEAGE_PROMPT = prebuild_messages(TextSendMessage(text="請輸入里程（例如 K10+100 或 10+100）："))
+_PHOTO_PROMPT = prebuild_messages(
+    TextSendMessage(text="請上傳照片（完成後可輸入「完成」繼續）：", quick_reply=_PHOTO_QUICK_REPLY)
+)
+
+
+def _start_session(event: MessageEvent, key: str, line_bot_api: LineBotApi) -> None:
     session = Session(stage="event_type")
     _set_session(key, session)
     state.set_topic(key, REPORT_EVENT_TOPIC)
-    line_bot_api.reply_message(
-        event.reply_token,
-        TextSendMessage(
-            text="請選擇要回報的事件類型：",
-            quick_reply=_build_quick_reply(_EVENT_TYPES),
-        ),
-    )
+    line_bot_api.reply_message(event.reply_token, _EVENT_TYPE_PROMPT)
 
 
 def _prompt_location_method(event: MessageEvent, line_bot_api: LineBotApi) -> None:
-    quick_reply = QuickReply(
-        items=[
-            QuickReplyButton(action=MessageAction(label=option, text=option))
-            for option in _LOCATION_METHOD_OPTIONS
-        ]
-        + [_cancel_button()]
-    )
-    line_bot_api.reply_message(
-        event.reply_token,
-        TextSendMessage(
-            text="請分享事件地點：",
-            quick_reply=quick_reply,
-        ),
-    )
+    line_bot_api.reply_message(event.reply_token, _LOCATION_METHOD_PROMPT)
 
 
 def _prompt_coordinate_input(event: MessageEvent, line_bot_api: LineBotApi) -> None:
-    quick_reply = QuickReply(
-        items=[
-            QuickReplyButton(action=LocationAction(label="分享位置")),
-            _cancel_button(),
-        ]
-    )
-    line_bot_api.reply_message(
-        event.reply_token,
-        TextSendMessage(
-            text="請分享位置或輸入經緯度坐標（例如 121.123, 24.123）：",
-            quick_reply=quick_reply,
-        ),
-    )
+    line_bot_api.reply_message(event.reply_token, _COORDINATE_PROMPT)
 
 
 def _prompt_route_line(event: MessageEvent, line_bot_api: LineBotApi) -> None:
-    line_bot_api.reply_message(
-        event.reply_token,
-        TextSendMessage(
-            text="請選擇軌道路線別：",
-            quick_reply=_build_quick_reply(_ROUTE_LINES),
-        ),
-    )
+    line_bot_api.reply_message(event.reply_token, _ROUTE_LINE_PROMPT)
 
 
 def _prompt_track_side(event: MessageEvent, line_bot_api: LineBotApi, route_line: str) -> None:
     if route_line in _ROUTE_LINES_LEFT_RIGHT:
-        text = "請選擇邊別："
-        options = _LEFT_RIGHT_CHOICES
+        message = _LEFT_RIGHT_PROMPT
     elif route_line in _ROUTE_LINES_EAST_WEST:
-        text = "請選擇正線："
-        options = _EAST_WEST_CHOICES
+        message = _EAST_WEST_PROMPT
     else:
-        text = "請選擇邊別／正線："
-        options = _EAST_WEST_CHOICES
-
-    quick_reply = QuickReply(
-        items=[
-            QuickReplyButton(action=MessageAction(label=item, text=item))
-            for item in options
-        ]
-        + [_cancel_button()]
-    )
-    line_bot_api.reply_message(
-        event.reply_token,
-        TextSendMessage(text=text, quick_reply=quick_reply),
-    )
+        message = _TRACK_SIDE_FALLBACK_PROMPT
+    line_bot_api.reply_message(event.reply_token, message)
 
 
 def _prompt_mileage(event: MessageEvent, line_bot_api: LineBotApi) -> None:
-    line_bot_api.reply_message(
-        event.reply_token,
-        TextSendMessage(text="請輸入里程（例如 K10+100 或 10+100）："),
-    )
-
-
-def _photo_quick_reply() -> QuickReply:
-    return QuickReply(
-        items=[
-            QuickReplyButton(action=CameraAction(label="拍照")),
-            QuickReplyButton(action=CameraRollAction(label="相簿")),
-            QuickReplyButton(action=MessageAction(label="完成", text="完成")),
-            _cancel_button(),
-        ]
-    )
+    line_bot_api.reply_message(event.reply_token, _MILEAGE_PROMPT)
 
 
 def _prompt_photo(event: MessageEvent, line_bot_api: LineBotApi) -> None:
-    quick_reply = _photo_quick_reply()
-    line_bot_api.reply_message(
-        event.reply_token,
-        TextSendMessage(
-            text="請上傳照片（完成後可輸入「完成」繼續）：",
-            quick_reply=quick_reply,
-        ),
-    )
+    line_bot_api.reply_message(event.reply_token, _PHOTO_PROMPT)
 
 
 def _reply_with_summary(event: MessageEvent, line_bot_api: LineBotApi, session: Session) -> None:
@@ -269,7 +290,7 @@ def _reply_with_summary(event: MessageEvent, line_bot_api: LineBotApi, session:
         event.reply_token,
         TextSendMessage(
             text=_format_summary(session),
-            quick_reply=_confirm_quick_reply(),
+            quick_reply=_CONFIRM_QUICK_REPLY,
         ),
     )
 
@@ -302,24 +323,33 @@ def _format_summary(session: Session) -> str:
 
 
 def _parse_mileage(text: str) -> Tuple[Optional[str], Optional[float]]:
+    # Accepts "K10+100", "10+100" or "10"; same rules as the former ^k?\s*(\d+)(?:\+(\d+))?$ regex.
     cleaned = text.replace(" ", "")
-    match = _MILEAGE_PATTERN.match(cleaned)
-    if not match:
+    if cleaned[:1] in ("k", "K"):
+        cleaned = cleaned[1:]
+    head, sep, tail = cleaned.lstrip().partition("+")
+    if not head.isdecimal() or (sep and not tail.isdecimal()):
         return None, None
-    km = int(match.group(1))
-    offset = int(match.group(2) or "0")
+    km = int(head)
+    offset = int(tail or "0")
     mileage_text = f"{km}+{offset:03d}"
     mileage_meters = km * 1000 + offset
     return mileage_text, float(mileage_meters)
 
 
 def _parse_coordinate_text(text: str) -> Tuple[Optional[float], Optional[float]]:
-    normalized = (
-        text.replace("，", ",")
-        .replace("、", ",")
-        .replace("；", ",")
-        .replace(" ", "")
-    )
+    normalized = text.translate(_COORD_SEPARATORS)
+    # Usual input is "lon,lat": parse the two fields directly and only scan with the regex otherwise.
+    parts = normalized.split(",", 2)
+    if len(parts) >= 2:
+        try:
+            lon = float(parts[0])
+            lat = float(parts[1])
+        except ValueError:
+            pass
+        else:
+            if math.isfinite(lon) and math.isfinite(lat):
+                return lon, lat
     numbers = _COORD_PATTERN.findall(normalized)
     if len(numbers) < 2:
         return None, None
@@ -331,7 +361,9 @@ def _parse_coordinate_text(text: str) -> Tuple[Optional[float], Optional[float]]
     return lon, lat
 
 
-def _handle_event_type(event: MessageEvent, session: Session, incoming_text: str, line_bot_api: LineBotApi) -> bool:
+def _handle_event_type(
+    event: MessageEvent, key: str, session: Session, incoming_text: str, line_bot_api: LineBotApi
+) -> bool:
     if incoming_text not in _EVENT_TYPES:
         line_bot_api.reply_message(
             event.reply_token,
@@ -344,7 +376,9 @@ def _handle_event_type(event: MessageEvent, session: Session, incoming_text: str
     return True
 
 
-def _handle_location_method(event: MessageEvent, session: Session, incoming_text: str, line_bot_api: LineBotApi) -> bool:
+def _handle_location_method(
+    event: MessageEvent, key: str, session: Session, incoming_text: str, line_bot_api: LineBotApi
+) -> bool:
     if incoming_text not in _LOCATION_METHOD_OPTIONS:
         _prompt_location_method(event, line_bot_api)
         return True
@@ -361,7 +395,9 @@ def _handle_location_method(event: MessageEvent, session: Session, incoming_text
     return True
 
 
-def _handle_route_line(event: MessageEvent, session: Session, incoming_text: str, line_bot_api: LineBotApi) -> bool:
+def _handle_route_line(
+    event: MessageEvent, key: str, session: Session, incoming_text: str, line_bot_api: LineBotApi
+) -> bool:
     if incoming_text not in _ROUTE_LINES:
         _prompt_route_line(event, line_bot_api)
         return True
@@ -371,7 +407,9 @@ def _handle_route_line(event: MessageEvent, session: Session, incoming_text: str
     return True
 
 
-def _handle_track_side(event: MessageEvent, session: Session, incoming_text: str, line_bot_api: LineBotApi) -> bool:
+def _handle_track_side(
+    event: MessageEvent, key: str, session: Session, incoming_text: str, line_bot_api: LineBotApi
+) -> bool:
     if not session.route_line:
         session.stage = "route_line"
         _prompt_route_line(event, line_bot_api)
@@ -403,7 +441,9 @@ def _handle_track_side(event: MessageEvent, session: Session, incoming_text: str
     return True
 
 
-def _handle_mileage(event: MessageEvent, session: Session, incoming_text: str, line_bot_api: LineBotApi) -> bool:
+def _handle_mileage(
+    event: MessageEvent, key: str, session: Session, incoming_text: str, line_bot_api: LineBotApi
+) -> bool:
     if session.location_mode != "route":
         session.location_mode = "route"
     if not session.route_line:
@@ -443,7 +483,9 @@ def _handle_mileage(event: MessageEvent, session: Session, incoming_text: str, l
     return True
 
 
-def _handle_coordinate_text(event: MessageEvent, session: Session, incoming_text: str, line_bot_api: LineBotApi) -> bool:
+def _handle_coordinate_text(
+    event: MessageEvent, key: str, session: Session, incoming_text: str, line_bot_api: LineBotApi
+) -> bool:
     lon, lat = _parse_coordinate_text(incoming_text)
     if lon is None or lat is None:
         _prompt_coordinate_input(event, line_bot_api)
@@ -458,15 +500,16 @@ def _handle_coordinate_text(event: MessageEvent, session: Session, incoming_text
     return True
 
 
-def _handle_photo_stage_text(event: MessageEvent, session: Session, incoming_text: str, line_bot_api: LineBotApi) -> bool:
-    normalized = _normalize_text(incoming_text)
-    if normalized in _PHOTO_DONE_TOKENS:
+def _handle_photo_stage_text(
+    event: MessageEvent, key: str, session: Session, incoming_text: str, line_bot_api: LineBotApi
+) -> bool:
+    if _KEYWORD_ACTIONS.get(_normalize_text(incoming_text)) == _ACTION_PHOTO_DONE:
         if not session.photo_filenames:
             line_bot_api.reply_message(
                 event.reply_token,
                 TextSendMessage(
                     text="請先上傳至少一張照片，再輸入「完成」。",
-                    quick_reply=_photo_quick_reply(),
+                    quick_reply=_PHOTO_QUICK_REPLY,
                 ),
             )
             return True
@@ -478,15 +521,19 @@ def _handle_photo_stage_text(event: MessageEvent, session: Session, incoming_tex
         event.reply_token,
         TextSendMessage(
             text="請先上傳照片，完成後輸入「完成」或直接再傳照片。",
-            quick_reply=_photo_quick_reply(),
+            quick_reply=_PHOTO_QUICK_REPLY,
         ),
     )
     return True
 
 
-def _handle_confirmation(event: MessageEvent, session: Session, incoming_text: str, line_bot_api: LineBotApi) -> bool:
-    normalized = _normalize_text(incoming_text)
-    if normalized in _CONFIRM_YES_TOKENS:
+def _handle_confirmation(
+    event: MessageEvent, key: str, session: Session, incoming_text: str, line_bot_api: LineBotApi
+) -> bool:
+    action = _KEYWORD_ACTIONS.get(_normalize_text(incoming_text))
+    if action == _ACTION_CONFIRM_YES:
+        source_type = _resolve_source_type(event)
+        source_id = _resolve_source_id(event)
         record = ReportEventRecord(
             id=None,
             event_type=session.event_type or "",
@@ -499,15 +546,15 @@ def _handle_confirmation(event: MessageEvent, session: Session, incoming_text: s
             latitude=session.latitude,
             location_title=session.location_title,
             location_address=session.location_address,
-            source_type=_resolve_source_type(event),
-            source_id=_resolve_source_id(event),
+            source_type=source_type,
+            source_id=source_id,
         )
         repository.save_report(record)
         audit_record_action(
             "events.reported_via_line",
             channel="line",
-            actor_type=_resolve_source_type(event),
-            actor_id=_resolve_source_id(event),
+            actor_type=source_type,
+            actor_id=source_id,
             resource_type="reported_event",
             resource_id=str(record.id) if record.id else None,
             metadata={
@@ -518,7 +565,6 @@ def _handle_confirmation(event: MessageEvent, session: Session, incoming_text: s
                 "has_photo": bool(record.photo_filename),
             },
         )
-        key = _source_key(event)
         _set_session(key, None)
         state.set_topic(key, None)
         page_url = _event_public_link(get_public_page_url(), record)
@@ -530,8 +576,7 @@ def _handle_confirmation(event: MessageEvent, session: Session, incoming_text: s
         )
         return True
 
-    if normalized in _CONFIRM_NO_TOKENS:
-        key = _source_key(event)
+    if action == _ACTION_CONFIRM_NO:
         _set_session(key, None)
         state.set_topic(key, None)
         line_bot_api.reply_message(
@@ -547,6 +592,20 @@ def _handle_confirmation(event: MessageEvent, session: Session, incoming_text: s
     return True
 
 
+_StageHandler = Callable[[MessageEvent, str, Session, str, LineBotApi], bool]
+
+_STAGE_HANDLERS: Dict[str, _StageHandler] = {
+    "event_type": _handle_event_type,
+    "location_method": _handle_location_method,
+    "route_line": _handle_route_line,
+    "track_side": _handle_track_side,
+    "mileage": _handle_mileage,
+    "coordinate": _handle_coordinate_text,
+    "photo": _handle_photo_stage_text,
+    "confirm": _handle_confirmation,
+}
+
+
 def _resolve_source_type(event: MessageEvent) -> Optional[str]:
     source = event.source
     if getattr(source, "type", None):
@@ -571,10 +630,9 @@ def _resolve_source_id(event: MessageEvent) -> Optional[str]:
     return None
 
 
-def _handle_cancel(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
-    if _get_session(event) is None:
+def _handle_cancel(event: MessageEvent, key: str, line_bot_api: LineBotApi) -> bool:
+    if _get_session(key) is None:
         return False
-    key = _source_key(event)
     _set_session(key, None)
     state.set_topic(key, None)
     line_bot_api.reply_message(
@@ -589,36 +647,24 @@ def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
     if not incoming_text:
         return False
 
-    normalized = _normalize_text(incoming_text)
+    action = _KEYWORD_ACTIONS.get(_normalize_text(incoming_text))
+    key = state.source_key(event)
 
-    if normalized in _CANCEL_TOKENS:
-        return _handle_cancel(event, line_bot_api)
+    if action == _ACTION_CANCEL:
+        return _handle_cancel(event, key, line_bot_api)
 
-    if normalized in _TRIGGER_TOKENS:
-        _start_session(event, line_bot_api)
+    if action == _ACTION_TRIGGER:
+        _start_session(event, key, line_bot_api)
         return True
 
-    session = _get_session(event)
-    if session is None or state.get_topic(_source_key(event)) != REPORT_EVENT_TOPIC:
+    session = _get_session(key)
+    if session is None or state.get_topic(key) != REPORT_EVENT_TOPIC:
         return False
 
-    if session.stage == "event_type":
-        return _handle_event_type(event, session, incoming_text, line_bot_api)
-    if session.stage == "location_method":
-        return _handle_location_method(event, session, incoming_text, line_bot_api)
-    if session.stage == "route_line":
-        return _handle_route_line(event, session, incoming_text, line_bot_api)
-    if session.stage == "track_side":
-        return _handle_track_side(event, session, incoming_text, line_bot_api)
-    if session.stage == "mileage":
-        return _handle_mileage(event, session, incoming_text, line_bot_api)
-    if session.stage == "coordinate":
-        return _handle_coordinate_text(event, session, incoming_text, line_bot_api)
-    if session.stage == "photo":
-        return _handle_photo_stage_text(event, session, incoming_text, line_bot_api)
-    if session.stage == "confirm":
-        return _handle_confirmation(event, session, incoming_text, line_bot_api)
-    return False
+    handler = _STAGE_HANDLERS.get(session.stage)
+    if handler is None:
+        return False
+    return handler(event, key, session, incoming_text, line_bot_api)
 
 
 def _ensure_picture_dir() -> None:
@@ -642,27 +688,26 @@ def _save_image_content(event: MessageEvent, line_bot_api: LineBotApi) -> Option
     try:
         content = line_bot_api.get_message_content(event.message.id)
     except LineBotApiError as exc:
-        print(f"下載照片失敗：{exc}")
+        logger.warning("下載照片失敗：%s", exc)
         return None
 
     _ensure_picture_dir()
     ext = _guess_extension(getattr(content, "content_type", None))
-    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-    filename = f"{timestamp}_{uuid4().hex}{ext}"
+    timestamp = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+    filename = f"{timestamp}_{secrets.token_hex(16)}{ext}"
     path = _PICTURE_DIR / filename
     try:
         with path.open("wb") as fp:
-            for chunk in content.iter_content():
-                if chunk:
-                    fp.write(chunk)
+            # The SDK streams 1 KiB chunks by default; larger reads mean far fewer write calls per photo.
+            fp.writelines(content.iter_content(chunk_size=_PHOTO_CHUNK_SIZE))
     except OSError as exc:
-        print(f"寫入照片檔案失敗：{exc}")
+        logger.warning("寫入照片檔案失敗：%s", exc)
         return None
     return filename
 
 
 def handle_image_message(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
-    session = _get_session(event)
+    session = _get_session(state.source_key(event))
     if session is None or session.stage != "photo":
         return False
 
@@ -676,19 +721,18 @@ def handle_image_message(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
 
     session.photo_filenames.append(filename)
     count = len(session.photo_filenames)
-    quick_reply = _photo_quick_reply()
     line_bot_api.reply_message(
         event.reply_token,
         TextSendMessage(
             text=f"已收到第 {count} 張照片。若需要繼續請再上傳，完成請輸入「完成」。",
-            quick_reply=quick_reply,
+            quick_reply=_PHOTO_QUICK_REPLY,
         ),
     )
     return True
 
 
 def handle_location_message(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
-    session = _get_session(event)
+    session = _get_session(state.source_key(event))
     if session is None or session.stage != "coordinate":
         return False
 
@@ -707,5 +751,7 @@ __all__ = [
     "handle_image_message",
     "handle_location_message",
     "REPORT_EVENT_TOPIC",
+    "TRIGGER_KEYWORDS",
+    "CANCEL_KEYWORDS",
     "get_public_page_url",
 ]
@@ -6,6 +6,7 @@ import re
 from typing import Iterable, List, Optional, Sequence, Union
 
 PhotoInput = Union[str, Sequence[str], None]
+_SEPARATOR_PATTERN = re.compile(r"[\n,]+")
 
 
 def _clean_item(value: Optional[str]) -> Optional[str]:
@@ -53,7 +54,7 @@ def parse_photo_field(value: PhotoInput) -> List[str]:
                 return [decoded.strip()]
 
     if any(sep in text for sep in ("\n", ",")):
-        parts = [segment.strip() for segment in re.split(r"[\n,]+", text)]
+        parts = [segment.strip() for segment in _SEPARATOR_PATTERN.split(text)]
         return [segment for segment in parts if segment]
 
     return [text]
@@ -0,0 +1,183 @@
+"""LINE Messaging API client and webhook verification helpers."""
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import requests
+from linebot import LineBotApi
+from linebot.http_client import HttpClient, RequestsHttpClient, RequestsHttpResponse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_POOL_CONNECTIONS = int(os.getenv("LINE_API_POOL_CONNECTIONS", "32"))
+_POOL_MAXSIZE = int(os.getenv("LINE_API_POOL_MAXSIZE", "128"))
+_TIMEOUT = float(os.getenv("LINE_API_TIMEOUT", "5"))
+_MAX_REPLY_MESSAGES = 5
+
+logger = logging.getLogger(__name__)
+
+# id(messages) -> (messages, serialized "messages" array); the object is kept alive so ids stay unique.
+_PREBUILT_MESSAGES: Dict[int, Tuple[Any, str]] = {}
+_PREBUILT_LOCK = threading.Lock()
+
+
+class PooledRequestsHttpClient(RequestsHttpClient):
+    """RequestsHttpClient that reuses keep-alive connections through one Session."""
+
+    def __init__(self, timeout=HttpClient.DEFAULT_TIMEOUT):
+        super().__init__(timeout)
+        # urllib3 does not retry POST on bad status codes, so a reply is never sent twice;
+        # only connection failures are retried.
+        adapter = HTTPAdapter(
+            pool_connections=_POOL_CONNECTIONS,
+            pool_maxsize=_POOL_MAXSIZE,
+            max_retries=Retry(
+                total=2,
+                backoff_factor=0.1,
+                status_forcelist=(429, 500, 502, 503, 504),
+                # Hand the last error response back so the SDK still raises LineBotApiError.
+                raise_on_status=False,
+            ),
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        response = self.session.get(
+            url, headers=headers, params=params, stream=stream, timeout=timeout or self.timeout
+        )
+        return RequestsHttpResponse(response)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        response = self.session.post(url, headers=headers, data=data, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+    def delete(self, url, headers=None, data=None, timeout=None):
+        response = self.session.delete(url, headers=headers, data=data, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+    def put(self, url, headers=None, data=None, timeout=None):
+        response = self.session.put(url, headers=headers, data=data, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+
+class VerifiedSignature(str):
+    """Signature header that has already been checked against the request body."""
+
+
+class RawBodySignatureValidator:
+    """X-Line-Signature check that works on the raw request bytes."""
+
+    def __init__(self, channel_secret: str):
+        self.channel_secret = channel_secret.encode("utf-8")
+        # The key schedule is done once; each request copies the keyed state.
+        self._keyed_hmac = hmac.new(self.channel_secret, digestmod=hashlib.sha256)
+
+    def validate(self, body: bytes | str, signature: str) -> bool:
+        if isinstance(signature, VerifiedSignature):
+            # Checked by the callback view before the body was handed to the parser.
+            return True
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        mac = self._keyed_hmac.copy()
+        mac.update(body)
+        digest = mac.digest()
+        return hmac.compare_digest(signature.encode("utf-8"), base64.b64encode(digest))
+
+
+def prebuild_messages(messages):
+    """Serialize constant reply messages once; replies reusing the same object skip as_json_dict().
+
+    Topics call this at import time on their fixed prompts, so each prompt is serialized once
+    and reused for every reply.
+    """
+    items = messages if isinstance(messages, (list, tuple)) else [messages]
+    serialized = json.dumps([message.as_json_dict() for message in items])
+    with _PREBUILT_LOCK:
+        _PREBUILT_MESSAGES[id(messages)] = (messages, serialized)
+    return messages
+
+
+class PrebuiltReplyLineBotApi(LineBotApi):
+    """LineBotApi that splices pre-serialized message JSON into reply requests."""
+
+    def reply_message(self, reply_token, messages, notification_disabled=False, timeout=None):
+        prebuilt = _PREBUILT_MESSAGES.get(id(messages))
+        if prebuilt is None or prebuilt[0] is not messages:
+            return super().reply_message(
+                reply_token, messages, notification_disabled=notification_disabled, timeout=timeout
+            )
+        data = (
+            f'{{"replyToken": {json.dumps(reply_token)}, "messages": {prebuilt[1]}, '
+            f'"notificationDisabled": {"true" if notification_disabled else "false"}}}'
+        )
+        self._post("/v2/bot/message/reply", data=data, timeout=timeout)
+
+
+class BatchedReplies:
+    """Stand-in for LineBotApi that buffers reply_message calls made while handling one event."""
+
+    def __init__(self, line_bot_api: LineBotApi):
+        self._line_bot_api = line_bot_api
+        self._reply_token: Optional[str] = None
+        self._calls: List[Any] = []
+
+    def reply_message(self, reply_token, messages, notification_disabled=False, timeout=None):
+        self._reply_token = reply_token
+        self._calls.append(messages)
+
+    def flush(self) -> None:
+        if not self._calls:
+            return
+        if len(self._calls) == 1:
+            # Pass the original object through so prebuilt messages keep their cached JSON.
+            messages = self._calls[0]
+        else:
+            messages = [
+                message
+                for call in self._calls
+                for message in (call if isinstance(call, (list, tuple)) else [call])
+            ]
+            if len(messages) > _MAX_REPLY_MESSAGES:
+                logger.warning("Dropping %d reply messages over the LINE limit", len(messages) - _MAX_REPLY_MESSAGES)
+                messages = messages[:_MAX_REPLY_MESSAGES]
+        self._calls = []
+        self._line_bot_api.reply_message(self._reply_token, messages)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._line_bot_api, name)
+
+
+@contextmanager
+def batched_replies(line_bot_api: LineBotApi) -> Iterator[BatchedReplies]:
+    """Yield a reply buffer and send everything it collected in a single reply request."""
+    replies = BatchedReplies(line_bot_api)
+    try:
+        yield replies
+    finally:
+        replies.flush()
+
+
+def create_line_bot_api(channel_access_token: str) -> LineBotApi:
+    """Build the shared LineBotApi backed by a pooled HTTP session."""
+    return PrebuiltReplyLineBotApi(channel_access_token, timeout=_TIMEOUT, http_client=PooledRequestsHttpClient)
+
+
+__all__ = [
+    "BatchedReplies",
+    "PooledRequestsHttpClient",
+    "PrebuiltReplyLineBotApi",
+    "RawBodySignatureValidator",
+    "VerifiedSignature",
+    "batched_replies",
+    "create_line_bot_api",
+    "prebuild_messages",
+]
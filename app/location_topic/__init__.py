@@ -32,7 +32,10 @@ FIND_LOCATION_TOPIC = "Find location"
 _DISTANCE_TRIGGERS = {"里程轉座標", "里程轉坐標"}
 _COORDINATE_TRIGGERS = {"座標轉里程", "坐標轉里程"}
 _CANCEL_KEYWORDS = {"取消", "結束", "退出"}
+TRIGGER_KEYWORDS = frozenset(_DISTANCE_TRIGGERS | _COORDINATE_TRIGGERS)
+CANCEL_KEYWORDS = frozenset(_CANCEL_KEYWORDS)
 _NUMBER_PATTERN = re.compile(r"[-+]?\d+(?:\.\d+)?")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
 
 _DATA_PATH = RAILWAY_DATA_PATH
 
@@ -61,7 +64,7 @@ _LINE_NAMES = list(_LINE_DATA.keys())
 
 
 def _normalize_line_identifier(text: str) -> str:
-    return re.sub(r"\s+", "", text or "")
+    return _WHITESPACE_PATTERN.sub("", text or "")
 
 
 _LINE_NAME_BY_NORMALIZED = {
@@ -122,17 +125,6 @@ class SessionState:
 _SESSIONS: Dict[str, SessionState] = {}
 
 
-def _source_key(event: MessageEvent) -> str:
-    source = event.source
-    if getattr(source, "user_id", None):
-        return f"user:{source.user_id}"
-    if getattr(source, "group_id", None):
-        return f"group:{source.group_id}"
-    if getattr(source, "room_id", None):
-        return f"room:{source.room_id}"
-    return "global"
-
-
 def _chunked(seq: Sequence[MessageAction], size: int) -> List[List[MessageAction]]:
     return [list(seq[i : i + size]) for i in range(0, len(seq), size)]
 
@@ -163,14 +155,18 @@ def _build_line_selection_messages() -> List[TemplateSendMessage]:
     return messages
 
 
+# Quick replies are only serialized by the SDK, never mutated, so they can be shared.
+_CANCEL_QUICK_REPLY = QuickReply(items=[QuickReplyButton(action=MessageAction(label="取消", text="取消"))])
+_COORDINATE_QUICK_REPLY = QuickReply(
+    items=[
+        QuickReplyButton(action=LocationAction(label="分享位置")),
+        QuickReplyButton(action=MessageAction(label="取消", text="取消")),
+    ]
+)
+
+
 def _build_coordinate_prompt(text: str) -> TextSendMessage:
-    quick_reply = QuickReply(
-        items=[
-            QuickReplyButton(action=LocationAction(label="分享位置")),
-            QuickReplyButton(action=MessageAction(label="取消", text="取消")),
-        ]
-    )
-    return TextSendMessage(text=text, quick_reply=quick_reply)
+    return TextSendMessage(text=text, quick_reply=_COORDINATE_QUICK_REPLY)
 
 
 def _format_distance_marker(distance: float) -> str:
@@ -323,17 +319,17 @@ def _extract_two_numbers(text: str) -> Tuple[Optional[float], Optional[float]]:
 
 
 def _get_session(event: MessageEvent) -> Optional[SessionState]:
-    return _SESSIONS.get(_source_key(event))
+    return _SESSIONS.get(state.source_key(event, "global"))
 
 
 def _set_session(event: MessageEvent, session_state: SessionState) -> None:
-    source = _source_key(event)
+    source = state.source_key(event, "global")
     _SESSIONS[source] = session_state
     state.set_topic(source, FIND_LOCATION_TOPIC)
 
 
 def _clear_session(event: MessageEvent) -> None:
-    source = _source_key(event)
+    source = state.source_key(event, "global")
     _SESSIONS.pop(source, None)
     state.set_topic(source, None)
 
@@ -353,9 +349,7 @@ def _start_distance_mode(event: MessageEvent, line_bot_api: LineBotApi) -> None:
     messages = _build_line_selection_messages()
     cancel_message = TextSendMessage(
         text="若要取消查詢請點下方按鈕或輸入「取消」。",
-        quick_reply=QuickReply(
-            items=[QuickReplyButton(action=MessageAction(label="取消", text="取消"))]
-        ),
+        quick_reply=_CANCEL_QUICK_REPLY,
     )
     messages.append(cancel_message)
     line_bot_api.reply_message(event.reply_token, messages)
@@ -521,7 +515,7 @@ def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
         return False
 
     normalized = incoming_text.replace(" ", "")
-    source = _source_key(event)
+    source = state.source_key(event, "global")
 
     if normalized in _CANCEL_KEYWORDS:
         if _get_session(event):
@@ -606,6 +600,8 @@ __all__ = [
     "handle_message_event",
     "handle_location_message",
     "FIND_LOCATION_TOPIC",
+    "TRIGGER_KEYWORDS",
+    "CANCEL_KEYWORDS",
     "list_line_names",
     "format_distance_marker",
     "resolve_route_coordinate",
@@ -0,0 +1,55 @@
+"""Application logging setup with records written from a background thread."""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+_LOG_FORMAT = "%(asctime)s %(levelname)s [%(name)s] %(message)s"
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+def _start_listener(handlers: tuple[logging.Handler, ...]) -> None:
+    global _listener
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _restart_listener() -> None:
+    # The listener thread does not survive fork(); Gunicorn workers get a fresh queue and listener.
+    if _listener is not None:
+        _start_listener(_listener.handlers)
+
+
+def _stop_listener() -> None:
+    if _listener is not None:
+        _listener.stop()
+
+
+def configure_logging() -> None:
+    """Route the root logger through a queue so handlers never block request threads."""
+    global _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(_LOG_FORMAT))
+    _queue_handler = QueueHandler(queue.SimpleQueue())
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _start_listener((stream_handler,))
+    atexit.register(_stop_listener)
+    os.register_at_fork(after_in_child=_restart_listener)
+
+
+__all__ = ["configure_logging"]
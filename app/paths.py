@@ -6,6 +6,7 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parents[1]
 SRC_DIR = BASE_DIR / "src"
 STATIC_DIR = BASE_DIR / "static"
+TEMPLATES_DIR = BASE_DIR / "templates"
 DATA_DIR = BASE_DIR / "data"
 STORAGE_DIR = BASE_DIR / "storage"
 
@@ -15,3 +16,4 @@ CCTV_DATA_PATH = DATA_DIR / "cctv_data.json"
 RAINFALL_DB_PATH = DATA_DIR / "rainfall.db"
 EVENTS_DB_PATH = DATA_DIR / "report_events.db"
 AUDIT_LOG_DB_PATH = DATA_DIR / "audit_logs.db"
+WEBHOOK_EVENTS_DB_PATH = DATA_DIR / "webhook_events.db"
@@ -17,6 +17,7 @@ from linebot.models import (
     TextSendMessage,
 )
 from .. import state
+from ..line_api import prebuild_messages
 from ..rainfall_service import get_public_page_url, repository
 from ..rainfall_service.models import StationObservation
 
@@ -28,7 +29,10 @@ _MODE_LABELS = {
     "雨量查詢：關鍵字": "station",
     "雨量查詢：行政區": "district",
 }
+TRIGGER_KEYWORDS = frozenset(_TRIGGERS | _MODE_LABELS.keys())
+CANCEL_KEYWORDS = frozenset(_CANCEL_KEYWORDS)
 _COORD_PATTERN = re.compile(r"[-+]?\d+(?:\.\d+)?")
+_DISTRICT_SPLIT_PATTERN = re.compile(r"[\s,，]+")
 
 
 @dataclass
@@ -44,17 +48,6 @@ def _cancel_button() -> QuickReplyButton:
     return QuickReplyButton(action=MessageAction(label="取消", text="取消"))
 
 
-def _source_key(event: MessageEvent) -> str:
-    source = event.source
-    if getattr(source, "user_id", None):
-        return f"user:{source.user_id}"
-    if getattr(source, "group_id", None):
-        return f"group:{source.group_id}"
-    if getattr(source, "room_id", None):
-        return f"room:{source.room_id}"
-    return "unknown"
-
-
 def _build_entry_message() -> TextSendMessage:
     quick_reply = QuickReply(
         items=[
@@ -94,6 +87,12 @@ def _district_prompt() -> TextSendMessage:
         quick_reply=QuickReply(items=[_cancel_button()]),
     )
 
+_ENTRY_MESSAGE = prebuild_messages(_build_entry_message())
+_COORDINATE_PROMPT = prebuild_messages(_coordinate_prompt())
+_STATION_PROMPT = prebuild_messages(_station_prompt())
+_DISTRICT_PROMPT = prebuild_messages(_district_prompt())
+
+
 def _set_session(key: str, session: Optional[Session]) -> None:
     if session is None:
         _SESSIONS.pop(key, None)
@@ -190,7 +189,7 @@ def _reply_with_results(
 
 
 def _handle_coordinate_query(event: MessageEvent, line_bot_api: LineBotApi, longitude: float, latitude: float) -> bool:
-    source = _source_key(event)
+    source = state.source_key(event)
     items = repository.search_nearest_by_coordinate(longitude, latitude, limit=3)
     link_params = {
         "lon": f"{longitude:.6f}",
@@ -203,7 +202,7 @@ def _handle_coordinate_query(event: MessageEvent, line_bot_api: LineBotApi, long
 
 
 def _handle_station_query(event: MessageEvent, line_bot_api: LineBotApi, keyword: str) -> bool:
-    source = _source_key(event)
+    source = state.source_key(event)
     items = repository.search_by_station_name(keyword, limit=5)
     _reply_with_results(event, line_bot_api, items)
     _set_session(source, None)
@@ -212,8 +211,8 @@ def _handle_station_query(event: MessageEvent, line_bot_api: LineBotApi, keyword
 
 
 def _handle_district_query(event: MessageEvent, line_bot_api: LineBotApi, text: str) -> bool:
-    source = _source_key(event)
-    sanitized = re.split(r"[\s,，]+", text.strip(), maxsplit=1)
+    source = state.source_key(event)
+    sanitized = _DISTRICT_SPLIT_PATTERN.split(text.strip(), maxsplit=1)
     if not sanitized or not sanitized[0]:
         line_bot_api.reply_message(event.reply_token, TextSendMessage(text="請輸入縣市或縣市＋行政區。"))
         return True
@@ -228,14 +227,14 @@ def _handle_district_query(event: MessageEvent, line_bot_api: LineBotApi, text:
 
 def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
     incoming_text = (event.message.text or "").strip()
-    source = _source_key(event)
+    source = state.source_key(event)
 
     if incoming_text in _TRIGGERS:
         state.set_topic(source, CHECK_RAINFALL_TOPIC)
         _set_session(source, None)
         line_bot_api.reply_message(
             event.reply_token,
-            _build_entry_message(),
+            _ENTRY_MESSAGE,
         )
         return True
 
@@ -252,11 +251,11 @@ def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
         session = Session(mode=mode, stage="awaiting_input")
         _set_session(source, session)
         if mode == "coordinate":
-            line_bot_api.reply_message(event.reply_token, _coordinate_prompt())
+            line_bot_api.reply_message(event.reply_token, _COORDINATE_PROMPT)
         elif mode == "station":
-            line_bot_api.reply_message(event.reply_token, _station_prompt())
+            line_bot_api.reply_message(event.reply_token, _STATION_PROMPT)
         elif mode == "district":
-            line_bot_api.reply_message(event.reply_token, _district_prompt())
+            line_bot_api.reply_message(event.reply_token, _DISTRICT_PROMPT)
         return True
 
     if state.get_topic(source) != CHECK_RAINFALL_TOPIC:
@@ -269,7 +268,7 @@ def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
     if session.mode == "coordinate":
         lon, lat = _parse_coordinate_text(incoming_text)
         if lon is None or lat is None:
-            line_bot_api.reply_message(event.reply_token, _coordinate_prompt())
+            line_bot_api.reply_message(event.reply_token, _COORDINATE_PROMPT)
             return True
         return _handle_coordinate_query(event, line_bot_api, lon, lat)
     if session.mode == "station":
@@ -281,11 +280,11 @@ def handle_message_event(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
 
 
 def handle_location_message(event: MessageEvent, line_bot_api: LineBotApi) -> bool:
-    source = _source_key(event)
+    source = state.source_key(event)
     session = _SESSIONS.get(source)
     if not session or session.mode != "coordinate":
         return False
     return _handle_coordinate_query(event, line_bot_api, event.message.longitude, event.message.latitude)
 
 
-__all__ = ["handle_message_event", "handle_location_message", "CHECK_RAINFALL_TOPIC"]
+__all__ = ["handle_message_event", "handle_location_message", "CHECK_RAINFALL_TOPIC", "TRIGGER_KEYWORDS", "CANCEL_KEYWORDS"]
@@ -1,19 +1,61 @@
 """Per-source conversational topic tracking."""
 from __future__ import annotations
 
-from typing import Dict, Optional
+import threading
+from collections import OrderedDict
+from typing import Optional
 
-_topics: Dict[str, Optional[str]] = {}
+_MAX_TOPICS = 10_000
+
+# Webhook events are handled on worker threads, so guard the shared map and keep it bounded.
+_topics: "OrderedDict[str, str]" = OrderedDict()
+_topics_lock = threading.Lock()
+
+# (source attribute, actor type) in lookup order; shared by source_actor() and source_key().
+_SOURCE_ID_FIELDS = (("user_id", "user"), ("group_id", "group"), ("room_id", "room"))
+
+
+def source_actor(event) -> tuple[Optional[str], Optional[str]]:
+    """Return ``(actor_type, id)`` for an event's sender (user, then group, then room)."""
+    # One instance-dict read per field instead of getattr() with a default on the model object.
+    source = event.source
+    if source is None:
+        return None, None
+    source_fields = vars(source)
+    for attribute, actor_type in _SOURCE_ID_FIELDS:
+        value = source_fields.get(attribute)
+        if value:
+            return actor_type, value
+    return None, None
+
+
+def source_key(event, fallback: str = "unknown") -> str:
+    """Return the key used to track state for an event's sender."""
+    actor_type, actor_id = source_actor(event)
+    if actor_id is None:
+        return fallback
+    return f"{actor_type}:{actor_id}"
 
 
 def set_topic(source_id: str, topic: Optional[str]) -> None:
     """Record current topic for a given source (user/group/room)."""
-    if topic is None:
-        _topics.pop(source_id, None)
-    else:
+    with _topics_lock:
+        if topic is None:
+            _topics.pop(source_id, None)
+            return
         _topics[source_id] = topic
+        _topics.move_to_end(source_id)
+        if len(_topics) > _MAX_TOPICS:
+            _topics.popitem(last=False)
 
 
 def get_topic(source_id: str) -> Optional[str]:
     """Return the active topic for a source, if any."""
-    return _topics.get(source_id)
+    with _topics_lock:
+        return _topics.get(source_id)
+
+
+def pop_topic(source_id: str) -> Optional[str]:
+    """Clear the active topic for a source and return what it was."""
+    with _topics_lock:
+        return _topics.pop(source_id, None)
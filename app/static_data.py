@@ -1,17 +1,25 @@
 import os
 
-from flask import abort, Blueprint, send_from_directory
+from flask import abort, Blueprint, Response, send_from_directory
 
 from .paths import DATA_DIR, EVENT_PICTURES_DIR
 
 
 static_data_bp = Blueprint("static_data", __name__)
 
+_DATA_ROOT = str(DATA_DIR)
+_EVENT_PICTURES_ROOT = str(EVENT_PICTURES_DIR)
+# When a reverse proxy serves the pictures directory (e.g. an nginx `internal` location
+# aliased to storage/events/pictures), hand the file off via X-Accel-Redirect.
+_EVENT_PICTURES_ACCEL_PREFIX = os.getenv("EVENT_PICTURES_ACCEL_PREFIX", "").rstrip("/")
+# Picture names are timestamp + random token and are never overwritten, so clients can keep them.
+_EVENT_PICTURE_MAX_AGE = 86400
+
 
 @static_data_bp.route("/cctv_data.json")
 def cctv_data():
     return send_from_directory(
-        str(DATA_DIR),
+        _DATA_ROOT,
         "cctv_data.json",
         max_age=60,
         conditional=True,
@@ -28,9 +36,17 @@ def _normalize_picture_path(filename: str) -> str:
 @static_data_bp.route("/events/pictures/<path:filename>")
 def event_picture(filename: str):
     safe_filename = _normalize_picture_path(filename)
+    if _EVENT_PICTURES_ACCEL_PREFIX:
+        response = Response()
+        response.headers["X-Accel-Redirect"] = f"{_EVENT_PICTURES_ACCEL_PREFIX}/{safe_filename}"
+        response.headers["Cache-Control"] = f"public, max-age={_EVENT_PICTURE_MAX_AGE}"
+        # Let the proxy pick the Content-Type for the image.
+        del response.headers["Content-Type"]
+        return response
+    # Without a proxy, Gunicorn's wsgi.file_wrapper already uses sendfile(2) for this response.
     return send_from_directory(
-        str(EVENT_PICTURES_DIR),
+        _EVENT_PICTURES_ROOT,
         safe_filename,
-        max_age=300,
+        max_age=_EVENT_PICTURE_MAX_AGE,
         conditional=True,
     )
@@ -0,0 +1,107 @@
+"""Skip LINE webhook events that were already handled by any worker process."""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Optional
+
+from .paths import WEBHOOK_EVENTS_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+_TTL_SECONDS = 600.0
+_PRUNE_INTERVAL_SECONDS = 60.0
+
+_CONNECTION: Optional[sqlite3.Connection] = None
+_LOCK = threading.Lock()
+_next_prune_at = 0.0
+
+# A redelivery can reach another Gunicorn worker, so seen keys live in SQLite rather than in memory.
+# An expired key is re-armed by the upsert, so rows awaiting the next prune never block a new event.
+_MARK_SEEN_SQL = """
+    INSERT INTO webhook_events (event_key, expires_at) VALUES (?, ?)
+    ON CONFLICT (event_key) DO UPDATE SET expires_at = excluded.expires_at
+    WHERE webhook_events.expires_at <= ?
+"""
+
+
+def _resolve_db_path() -> Path:
+    path_text = os.getenv("WEBHOOK_EVENTS_DB_PATH")
+    path = Path(path_text) if path_text else WEBHOOK_EVENTS_DB_PATH
+    if not path.is_absolute():
+        path = (Path(__file__).resolve().parent / path).resolve()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _get_connection() -> sqlite3.Connection:
+    global _CONNECTION
+    if _CONNECTION is None:
+        conn = sqlite3.connect(_resolve_db_path(), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL;")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS webhook_events (
+                event_key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_webhook_events_expires_at
+            ON webhook_events (expires_at);
+            """
+        )
+        conn.commit()
+        _CONNECTION = conn
+    return _CONNECTION
+
+
+def _event_key(event) -> Optional[str]:
+    event_id = getattr(event, "webhook_event_id", None)
+    if event_id:
+        return event_id
+    message = getattr(event, "message", None)
+    message_id = getattr(message, "id", None)
+    return f"message:{message_id}" if message_id else None
+
+
+def mark_seen(event) -> bool:
+    """Record the event and return False if it was already seen within the TTL."""
+    global _next_prune_at
+    key = _event_key(event)
+    if key is None:
+        return True
+    now = time.time()
+    try:
+        with _LOCK:
+            conn = _get_connection()
+            with conn:
+                if now >= _next_prune_at:
+                    conn.execute("DELETE FROM webhook_events WHERE expires_at <= ?", (now,))
+                    _next_prune_at = now + _PRUNE_INTERVAL_SECONDS
+                cursor = conn.execute(_MARK_SEEN_SQL, (key, now + _TTL_SECONDS, now))
+    except sqlite3.Error:
+        # Handling an event twice is better than dropping it because the dedup store failed.
+        logger.exception("Failed to record webhook event %s", key)
+        return True
+    return cursor.rowcount > 0
+
+
+def dedupe_event(func: Callable) -> Callable:
+    """Decorate a webhook event handler so redelivered events are ignored."""
+
+    # Keep a single positional parameter: WebhookHandler inspects it to decide what to pass.
+    @wraps(func)
+    def wrapper(event):
+        if not mark_seen(event):
+            return None
+        return func(event)
+
+    return wrapper
+
+
+__all__ = ["dedupe_event", "mark_seen"]
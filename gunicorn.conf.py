@@ -0,0 +1,38 @@
+"""Gunicorn settings for serving the Flask app in production."""
+import os
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+
+if worker_class == "gevent":
+    # Patch before preload imports requests/ssl so outbound LINE API calls yield.
+    from gevent import monkey
+
+    monkey.patch_all()
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = 5
+accesslog = "-"
+errorlog = "-"
+
+
+def post_fork(server, worker):
+    # SQLite handles must not be shared across fork(); let each worker open its own.
+    # (The audit log keeps per-thread connections and already checks the pid.)
+    from app import webhook_dedup
+    from app.event_report_topic import database as events_database
+    from app.rainfall_service import database as rainfall_database
+
+    for module in (events_database, rainfall_database, webhook_dedup):
+        module._CONNECTION = None
+
+
+def worker_exit(server, worker):
+    # Webhooks are acknowledged before they are handled; finish the queued events before exiting.
+    from app import shutdown_webhook_lanes
+
+    shutdown_webhook_lanes()